@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import unicodedata
+import zlib
+
+import numpy as np
+
+import author_store
+from publ_store import Strings, decode_string
+from snapshot import stats, read_arrays
+
+# Index of authors.json for point queries, written by prepare_data.py after collect_author_info and loaded
+# memory-mapped, so that a query only reads the pages it touches. Authors are kept as the arrays of
+# author_store.author_arrays, in the order of authors.json, and found by position ("id"):
+# - by pid, through an open-addressing hash table of crc32(pid) over the ids;
+# - by tokens of their names (including DBLP disambiguation suffixes such as 0001) and of their affiliations,
+#   through a hash table of tokens and the sorted ids of the authors with each token;
+# - by first and last year with publications (as in --author-start-year of export.py), through the ids sorted by
+#   each. Tokens are lowercased words with accents removed, and queries match authors with all their tokens.
+
+version = 1
+index_path = os.path.join('cache', 'author_index')
+token_pattern = re.compile(r'\w+')
+
+
+def tokens(text):
+    text = unicodedata.normalize('NFKD', text)
+    return token_pattern.findall(''.join(c for c in text if not unicodedata.combining(c)).lower())
+
+
+def hash_table(keys):
+    # Slots of keys (UTF-8 bytes) by crc32, linear probing, at most half full; -1 for empty slots
+    size = 8
+    while size < 2 * len(keys):
+        size *= 2
+    slots = [-1] * size
+    for i, key in enumerate(keys):
+        h = zlib.crc32(key) & (size - 1)
+        while slots[h] >= 0:
+            h = (h + 1) & (size - 1)
+        slots[h] = i
+    return np.array(slots, dtype=np.int32)
+
+
+def find(slots, blob, offsets, key):
+    # Position of key (a str) in the strings of blob and offsets, through their hash table; -1 if not there
+    key = key.encode('utf-8')
+    mask = len(slots) - 1
+    h = zlib.crc32(key) & mask
+    while True:
+        i = int(slots[h])
+        if i < 0 or blob[offsets[i]:offsets[i + 1]].tobytes() == key:
+            return i
+        h = (h + 1) & mask
+
+
+def token_arrays(texts):
+    # texts: strings of each author; tokens, their hash table, and the ids of the authors having each
+    postings = {}
+    for i, strings in enumerate(texts):
+        for t in sorted(set(t for s in strings for t in tokens(s))):
+            postings.setdefault(t, []).append(i)
+    words = sorted(postings)
+    arrays = Strings(words).arrays('tokens')
+    arrays['table'] = hash_table([w.encode('utf-8') for w in words])
+    arrays['postings'] = np.array([i for w in words for i in postings[w]], dtype=np.int32)
+    arrays['postings_offsets'] = np.cumsum([0] + [len(postings[w]) for w in words], dtype=np.int64)
+    return arrays
+
+
+def build_index(authors_path='authors.json', path=index_path):
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    meta = {'version': version, 'sources': stats([authors_path])}
+
+    def save(group, arrays):
+        for name, a in arrays.items():
+            np.save(os.path.join(tmp_path, '%s.%s.npy' % (group, name)), np.asarray(a))
+
+    by_pid = author_store.load_authors(authors_path)
+    authors = list(by_pid.values())
+    arrays = author_store.author_arrays(by_pid)
+    arrays['pid_table'] = hash_table([a.pid.encode('utf-8') for a in authors])
+    arrays.update(Strings([json.dumps(a.extra, ensure_ascii=False) if a.extra else '' for a in authors])
+                  .arrays('extra'))
+    save('authors', arrays)
+    save('name', token_arrays([[a.name] for a in authors]))
+    save('affiliation', token_arrays([a.affiliation for a in authors]))
+    # Authors without any year are first and last in 0
+    first = np.array([a.first_year() if a.years else 0 for a in authors], dtype=np.int32)
+    last = np.array([max(int(y) for y in a.years[::2]) if a.years else 0 for a in authors], dtype=np.int32)
+    years = {}
+    for name, column in [('first', first), ('last', last)]:
+        order = np.argsort(column, kind='stable').astype(np.int32)
+        years.update({name: column, name + '_order': order, name + '_sorted': column[order]})
+    save('years', years)
+
+    json.dump(meta, open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8'))
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def fresh(path=index_path, authors_path='authors.json'):
+    # Whether the index is there and was built from the authors.json now in place
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    meta = json.load(open(meta_path, 'r', encoding='utf-8'))
+    return meta['version'] == version and meta['sources'] == stats([authors_path])
+
+
+class AuthorIndex:
+    def __init__(self, path=index_path):
+        self.authors = read_arrays('authors', path)
+        self.tokens = {'name': read_arrays('name', path), 'affiliation': read_arrays('affiliation', path)}
+        self.years = read_arrays('years', path)
+
+    def __len__(self):
+        return len(self.authors['pid_offsets']) - 1
+
+    def string(self, field, i):
+        return decode_string(self.authors[field], self.authors[field + '_offsets'], i)
+
+    def find(self, pid):
+        # Id of pid, -1 if not there
+        return find(self.authors['pid_table'], self.authors['pid'], self.authors['pid_offsets'], pid)
+
+    def author(self, i):
+        # The Author of id i
+        a = self.authors
+
+        def strings(field):
+            start, end = a[field + '_index'][i], a[field + '_index'][i + 1]
+            values = [decode_string(a[field], a[field + '_offsets'], j) for j in range(start, end)]
+            return tuple(json.loads(v) if is_json else v for v, is_json in zip(values, a[field + '_json'][start:end]))
+
+        def flat_years(field):
+            values = a[field][a[field + '_index'][i]:a[field + '_index'][i + 1]].tolist()
+            return tuple(str(v) if j % 2 == 0 else v for j, v in enumerate(values))
+
+        extra = self.string('extra', i)
+        return author_store.Author.from_fields(
+            self.string('pid', i), self.string('name', i), strings('affiliation'), strings('url'),
+            self.string('google', i) if a['has_google'][i] else None, flat_years('years'),
+            flat_years('years_dedup'), json.loads(extra) if extra else None)
+
+    def get(self, pid):
+        # The Author of pid, None if not there
+        i = self.find(pid)
+        return self.author(i) if i >= 0 else None
+
+    def token_ids(self, field, text):
+        # Ids, in ascending order, of the authors with all tokens of text in field ('name' or 'affiliation'); none if
+        # text has no tokens (e.g. only punctuation)
+        t = self.tokens[field]
+        ids = np.zeros(0, dtype=np.int32)
+        for n, token in enumerate(tokens(text)):
+            k = find(t['table'], t['tokens'], t['tokens_offsets'], token)
+            if k < 0:
+                return np.zeros(0, dtype=np.int32)
+            postings = t['postings'][t['postings_offsets'][k]:t['postings_offsets'][k + 1]]
+            ids = np.array(postings) if n == 0 else np.intersect1d(ids, postings, assume_unique=True)
+        return ids
+
+    def year_ids(self, field, start=None, end=None):
+        # Ids, in ascending order, of the authors with their first or last ('first', 'last') year in [start, end]
+        values = self.years[field + '_sorted']
+        lo = 0 if start is None else np.searchsorted(values, start, 'left')
+        hi = len(values) if end is None else np.searchsorted(values, end, 'right')
+        return np.sort(self.years[field + '_order'][lo:hi])
+
+    def query(self, name=None, affiliation=None, first_start=None, first_end=None, last_start=None, last_end=None):
+        # Ids, in the order of authors.json, of the authors matching all the conditions given
+        ids = []
+        if name is not None:
+            ids.append(self.token_ids('name', name))
+        if affiliation is not None:
+            ids.append(self.token_ids('affiliation', affiliation))
+        if first_start is not None or first_end is not None:
+            ids.append(self.year_ids('first', first_start, first_end))
+        if last_start is not None or last_end is not None:
+            ids.append(self.year_ids('last', last_start, last_end))
+        if not ids:
+            return np.arange(len(self), dtype=np.int32)
+        result = ids[0]
+        for other in ids[1:]:
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def summary(self, i):
+        # (pid, name, first year, last year) of id i
+        return self.string('pid', i), self.string('name', i), int(self.years['first'][i]), int(self.years['last'][i])
+
+
+def load_index(path=index_path, authors_path='authors.json'):
+    # The index, (re)built first if missing or older than authors.json
+    if not fresh(path, authors_path):
+        build_index(authors_path, path)
+    return AuthorIndex(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--build', action='store_true', help="(Re)build the index from authors.json")
+    parser.add_argument('--pid', type=str, default=None, help="Show the record of this author")
+    parser.add_argument('--name', type=str, default=None, help="Authors with all these words in their name")
+    parser.add_argument('--affiliation', type=str, default=None,
+                        help="Authors with all these words in their affiliations")
+    parser.add_argument('--first-year-start', type=int, default=None, help="Authors with their first paper from")
+    parser.add_argument('--first-year-end', type=int, default=None, help="Authors with their first paper to")
+    parser.add_argument('--last-year-start', type=int, default=None, help="Authors with their last paper from")
+    parser.add_argument('--last-year-end', type=int, default=None, help="Authors with their last paper to")
+    parser.add_argument('--limit', type=int, default=50, help="Number of authors listed")
+    args = parser.parse_args()
+
+    if args.build:
+        build_index()
+    index = load_index()
+    if args.pid is not None:
+        author = index.get(args.pid)
+        print(json.dumps(author.to_json() if author is not None else None, ensure_ascii=False, indent=1))
+    else:
+        ids = index.query(args.name, args.affiliation, args.first_year_start, args.first_year_end,
+                          args.last_year_start, args.last_year_end)
+        for i in ids[:args.limit].tolist():
+            print("%s\t%s\t%d\t%d" % index.summary(i))
+        print("%d authors" % len(ids))
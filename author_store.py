@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Author information by pid, kept in SQLite so that a refresh only revalidates the authors that may have changed and
+# updates them in place. Each record keeps a stamp of what it was built from (e.g. the number of publications of the
+# author in publications.json), the time it was last checked against DBLP, and a hash of its content; authors.json
+# is exported from the store, and loaded by export.py as Author records.
+
+
+def content_hash(info):
+    return hashlib.sha1(json.dumps(info, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class AuthorStore:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS authors (pid TEXT PRIMARY KEY, stamp TEXT, checked REAL, '
+                          'hash TEXT, info TEXT)')
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM authors').fetchone()[0]
+
+    def stamps(self):
+        # {pid: (stamp, checked)}
+        return dict((pid, (stamp, checked)) for pid, stamp, checked in
+                    self.conn.execute('SELECT pid, stamp, checked FROM authors'))
+
+    def put(self, pid, stamp, info, checked=None, commit=True):
+        # Returns whether the content of the record changed
+        h = content_hash(info)
+        row = self.conn.execute('SELECT hash FROM authors WHERE pid = ?', (pid,)).fetchone()
+        checked = time.time() if checked is None else checked
+        if row is not None and row[0] == h:
+            self.conn.execute('UPDATE authors SET stamp = ?, checked = ? WHERE pid = ?', (stamp, checked, pid))
+        else:
+            self.conn.execute('INSERT OR REPLACE INTO authors VALUES (?, ?, ?, ?, ?)',
+                              (pid, stamp, checked, h, json.dumps(info, ensure_ascii=False)))
+        if commit:
+            self.conn.commit()
+        return row is None or row[0] != h
+
+    def commit(self):
+        self.conn.commit()
+
+    def get(self, pid):
+        row = self.conn.execute('SELECT info FROM authors WHERE pid = ?', (pid,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def export(self, pids, path):
+        # Writes the records of pids, in that order, as a JSON object; returns the fingerprint of its content
+        results = {}
+        hashes = []
+        for pid in pids:
+            row = self.conn.execute('SELECT hash, info FROM authors WHERE pid = ?', (pid,)).fetchone()
+            if row is None:
+                continue
+            hashes.append([pid, row[0]])
+            results[pid] = json.loads(row[1])
+        tmp_path = path + '.tmp'
+        json.dump(results, open(tmp_path, 'w', encoding='utf-8'), ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        return content_hash(hashes)
+
+
+class Author:
+    # An author of authors.json, kept with __slots__ and tuples instead of dicts and lists; years and years_dedup
+    # are flat (year, count, year, count, ...) tuples in the order of authors.json, with interned years. Other
+    # fields, if any, are kept in extra
+    __slots__ = ['pid', 'name', 'affiliation', 'url', 'google', 'years', 'years_dedup', 'extra']
+    fields = ['affiliation', 'url', 'pid', 'name', 'years', 'years_dedup', 'google']
+
+    def __init__(self, info):
+        self.pid = info['pid']
+        self.name = info['name']
+        self.affiliation = tuple(info.get('affiliation', []))
+        self.url = tuple(info.get('url', []))
+        self.google = info.get('google')
+        self.years = flat_years(info['years'])
+        self.years_dedup = flat_years(info['years_dedup'])
+        self.extra = dict((k, v) for k, v in info.items() if k not in self.fields) or None
+
+    @classmethod
+    def from_fields(cls, pid, name, affiliation, url, google, years, years_dedup, extra=None):
+        author = cls.__new__(cls)
+        author.pid, author.name, author.affiliation, author.url, author.google = pid, name, affiliation, url, google
+        author.years, author.years_dedup, author.extra = years, years_dedup, extra
+        return author
+
+    def first_year(self):
+        return min(int(y) for y in self.years[::2])
+
+    def top_years(self, n=5):
+        # [(year, count)] of the n years with most publications (deduplicated), ties in the order of authors.json
+        years = list(zip(self.years_dedup[::2], self.years_dedup[1::2]))
+        years.sort(key=lambda x: -x[-1])
+        return years[:n]
+
+    def to_json(self):
+        # The record of authors.json
+        info = {'affiliation': list(self.affiliation), 'url': list(self.url), 'pid': self.pid, 'name': self.name,
+                'years': dict(zip(self.years[::2], self.years[1::2])),
+                'years_dedup': dict(zip(self.years_dedup[::2], self.years_dedup[1::2]))}
+        if self.google is not None:
+            info['google'] = self.google
+        info.update(self.extra or {})
+        return info
+
+
+def flat_years(years):
+    return tuple(v for year, count in years.items() for v in (sys.intern(year), count))
+
+
+def load_authors(path='authors.json'):
+    # {pid: Author} of authors.json, each record converted as soon as it is parsed
+    def hook(pairs):
+        info = dict(pairs)
+        return Author(info) if 'pid' in info and 'years_dedup' in info else info
+    return json.load(open(path, 'r', encoding='utf-8'), object_pairs_hook=hook)
+
+
+def author_arrays(authors):
+    # {pid: Author} as arrays (see snapshot.py): strings as UTF-8 blobs with offsets, lists and years as values with
+    # the offsets of each author into them, the years being (year, count) pairs; google is '' where unset, and
+    # list items other than strings (e.g. urls with a type) are kept as JSON
+    import numpy as np
+    from publ_store import Strings
+
+    authors = list(authors.values())
+    arrays = {}
+    for field in ['pid', 'name', 'google']:
+        arrays.update(Strings([getattr(a, field) or '' for a in authors]).arrays(field))
+    for field in ['affiliation', 'url']:
+        values = [v for a in authors for v in getattr(a, field)]
+        arrays.update(Strings([v if isinstance(v, str) else json.dumps(v, ensure_ascii=False) for v in values])
+                      .arrays(field))
+        arrays[field + '_json'] = np.array([not isinstance(v, str) for v in values], dtype=bool)
+        arrays[field + '_index'] = np.cumsum([0] + [len(getattr(a, field)) for a in authors], dtype=np.int64)
+    arrays['has_google'] = np.array([a.google is not None for a in authors], dtype=bool)
+    for field in ['years', 'years_dedup']:
+        arrays[field] = np.array([int(v) for a in authors for v in getattr(a, field)], dtype=np.int32)
+        arrays[field + '_index'] = np.cumsum([0] + [len(getattr(a, field)) for a in authors], dtype=np.int64)
+    return arrays
+
+
+def authors_from_arrays(arrays, extra=None):
+    # The {pid: Author} of author_arrays; extra: {pid: extra fields}
+    import numpy as np
+    from publ_store import Strings
+
+    strings = dict((field, Strings.from_arrays(arrays[field], arrays[field + '_offsets']).tolist())
+                   for field in ['pid', 'name', 'google', 'affiliation', 'url'])
+    for field in ['affiliation', 'url']:
+        for i in np.nonzero(arrays[field + '_json'])[0].tolist():
+            strings[field][i] = json.loads(strings[field][i])
+    index = dict((field, arrays[field + '_index'].tolist()) for field in ['affiliation', 'url', 'years', 'years_dedup'])
+    years = dict((field, arrays[field].tolist()) for field in ['years', 'years_dedup'])
+    has_google = arrays['has_google'].tolist()
+    year_names = {}
+
+    def flat_years(field, i):
+        values = years[field][index[field][i]:index[field][i + 1]]
+        for j in range(0, len(values), 2):
+            if values[j] not in year_names:
+                year_names[values[j]] = sys.intern(str(values[j]))
+            values[j] = year_names[values[j]]
+        return tuple(values)
+
+    authors = {}
+    extra = extra or {}
+    for i, pid in enumerate(strings['pid']):
+        authors[pid] = Author.from_fields(
+            pid, strings['name'][i],
+            tuple(strings['affiliation'][index['affiliation'][i]:index['affiliation'][i + 1]]),
+            tuple(strings['url'][index['url'][i]:index['url'][i + 1]]), strings['google'][i] if has_google[i] else None,
+            flat_years('years', i), flat_years('years_dedup', i), extra.get(pid))
+    return authors
@@ -0,0 +1,95 @@
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import publ_store
+from ranking import rank_authors
+
+
+def legacy_rank_authors(publs, authors, n_pubs, author_start_year, rank_start, rank_end):
+    # The per-publication loop export.main used before ranking.py, kept as the baseline
+    publs = sorted(publs, key=lambda x: -x['tags']['year'])
+    for publ in publs:
+        for a in publ['authors']:
+            pid = a['@pid']
+            a['pid'] = pid
+            del a['@pid']
+            if pid in authors:
+                if 'tags' not in authors[pid]:
+                    authors[pid]['tags'] = {'Year': defaultdict(int), 'Venue': defaultdict(int),
+                                            'Interspeech': defaultdict(int), 'IEEE': defaultdict(int)}
+                    authors[pid]['pubs'] = []
+                for k, v in publ['tags'].items():
+                    if k == 'year':
+                        bin = 'Year'
+                    elif k == 'venue':
+                        bin = 'Venue'
+                    elif k == 'track':
+                        bin = 'Interspeech'
+                    elif k.startswith('keyword:'):
+                        bin = 'IEEE'
+                        v = k[len('keyword:'):]
+                    authors[pid]['tags'][bin][v] += 1
+                authors[pid]['pubs'].append(publ)
+    authors = [a for a in authors.values() if 'pubs' in a]
+    authors = [a for a in authors if min([int(t) for t in a['years'].keys()]) >= author_start_year]
+    authors.sort(key=lambda x: -len(x['pubs']))
+    for i, a in enumerate(authors):
+        for tag in a['tags']:
+            a['tags'][tag] = list(a['tags'][tag].items())
+            a['tags'][tag].sort(key=lambda x: -x[1])
+        a['tags']['Year'].sort(key=lambda x: -x[0])
+        a['pubs'] = a['pubs'][:n_pubs]
+        a['rank'] = i + 1
+    return authors[rank_start: rank_end]
+
+
+def row(a):
+    # What export.py renders of an author: the legacy loop keeps whole publications, ranking.py only these fields
+    pubs = [(p['title'], p['url'], p['tags']['year'], p['tags']['venue'], [(x['pid'], x['text']) for x in p['authors']])
+            for p in a['pubs']]
+    return a['rank'], a['pid'], a['name'], a['tags'], pubs
+
+
+def timeit(f, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = f()
+        times.append(time.perf_counter() - t)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--publications', type=str, default='publications.json')
+    parser.add_argument('--authors', type=str, default='authors.json')
+    parser.add_argument('--n-pubs', type=int, default=20)
+    parser.add_argument('--rank-end', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    publs = json.load(open(args.publications, 'r', encoding='utf-8'))
+    authors = json.load(open(args.authors, 'r', encoding='utf-8'))
+    print("%d publications, %d authors" % (len(publs), len(authors)))
+
+    # The legacy loop mutates its input, so it gets fresh copies (copying is not timed)
+    legacy_times, legacy = [], None
+    for _ in range(args.repeat):
+        publs_copy, authors_copy = copy.deepcopy(publs), copy.deepcopy(authors)
+        t = time.perf_counter()
+        legacy = legacy_rank_authors(publs_copy, authors_copy, args.n_pubs, 1900, 0, args.rank_end)
+        legacy_times.append(time.perf_counter() - t)
+
+    columns, vocab = publ_store.columns_from_publications(publs)
+    t_bulk, bulk = timeit(lambda: rank_authors(columns, vocab, authors, args.n_pubs, 1900, 0, args.rank_end),
+                          args.repeat)
+
+    assert [row(a) for a in legacy] == [row(a) for a in bulk]
+    print("Legacy loop: %.3fs" % min(legacy_times))
+    print("Bulk ranking: %.3fs (%.1fx)" % (t_bulk, min(legacy_times) / t_bulk))
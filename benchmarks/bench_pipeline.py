@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import synth_corpus
+
+# End-to-end benchmark of prepare_data.py and export.py on a synthetic corpus (see synth_corpus.py). Each stage runs
+# in its own process, from a fresh copy of the corpus, through the same command line as usual; its wall time, peak
+# RSS and bytes read and written are recorded in a JSON results file, which can be compared with that of another run.
+# Requests missing from the corpus fail instead of going to the network.
+
+
+class OfflineEngine:
+    def get(self, url, params=None):
+        raise ValueError("Not in the synthetic corpus: %s %s" % (url, params))
+
+
+def read_io():
+    # Bytes read and written by this process so far, on Linux
+    if not os.path.exists('/proc/self/io'):
+        return {}
+    return dict((k, int(v)) for k, v in (line.split(': ') for line in open('/proc/self/io').read().splitlines()))
+
+
+def peak_rss_mb():
+    # VmHWM is that of the script alone, whereas ru_maxrss may include that of the parent process before exec
+    if os.path.exists('/proc/self/status'):
+        for line in open('/proc/self/status').read().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def child(result_path, argv):
+    # Runs a script of the repository as from the command line, in the current directory
+    if argv[0] == 'prepare_data.py':
+        import fetch
+        fetch._engine = OfflineEngine()
+    io = read_io()
+    t = time.perf_counter()
+    sys.argv = argv
+    status = 'ok'
+    try:
+        runpy.run_path(os.path.join(root, argv[0]), run_name='__main__')
+    except SystemExit as e:
+        status = 'ok' if not e.code else 'exit %s' % e.code
+    except Exception as e:
+        status = repr(e)
+    wall = time.perf_counter() - t
+    io_end = read_io()
+    result = {'status': status, 'wall': wall, 'peak_rss_mb': peak_rss_mb()}
+    for k in ['rchar', 'wchar', 'read_bytes', 'write_bytes']:
+        result[k] = io_end[k] - io[k] if k in io else None
+    json.dump(result, open(result_path, 'w', encoding='utf-8'))
+
+
+def run_stage(run_dir, argv, log):
+    fd, result_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        log.write('$ %s\n' % ' '.join(argv))
+        log.flush()
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', result_path] + argv, cwd=run_dir,
+                       stdout=log, stderr=subprocess.STDOUT)
+        return json.load(open(result_path, 'r', encoding='utf-8'))
+    except ValueError:
+        return {'status': 'crashed'}
+    finally:
+        os.remove(result_path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(args):
+    corpus_dir = os.path.join(args.work_dir, 'corpus-%gx-%d' % (args.scale, args.seed))
+    t = time.perf_counter()
+    stats = synth_corpus.generate(corpus_dir, args.scale, args.seed)
+    print("Corpus %s: %s (%.1fs)" % (corpus_dir, stats, time.perf_counter() - t))
+
+    run_dir = os.path.join(args.work_dir, 'run')
+    if os.path.exists(run_dir):
+        shutil.rmtree(run_dir)
+    shutil.copytree(corpus_dir, run_dir)
+    for name in ['template.html', 'template_client.html']:
+        shutil.copy(os.path.join(root, name), run_dir)
+
+    stages = args.stages.split(',')
+    results = []
+    with open(os.path.join(run_dir, 'bench.log'), 'w', encoding='utf-8') as log:
+        # The warm pass runs on the outputs of the cold one, i.e. measures the runs with nothing to rebuild
+        for pass_ in ['cold', 'warm'] if args.warm else ['cold']:
+            for stage in stages:
+                if stage == 'export':
+                    argv = ['export.py'] + args.export_args.split()
+                else:
+                    argv = ['prepare_data.py', '--stages', stage]
+                result = dict({'stage': stage, 'pass': pass_}, **run_stage(run_dir, argv, log))
+                results.append(result)
+                print("%-28s %-5s %8.2fs %8.1f MB  read %s  written %s  %s" %
+                      (stage, pass_, result.get('wall', 0), result.get('peak_rss_mb', 0),
+                       size(result.get('rchar')), size(result.get('wchar')), result['status']))
+
+    report = {'corpus': dict(synth_corpus.corpus_stamp(args.scale, args.seed), **stats),
+              'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+              'python': platform.python_version(), 'platform': platform.platform(), 'stages': results}
+    output = args.output or os.path.join(args.work_dir, 'results', '%gx-%s.json' % (
+        args.scale, datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    json.dump(report, open(output, 'w', encoding='utf-8'), indent=1)
+    print("Results written to %s, log in %s" % (output, os.path.join(run_dir, 'bench.log')))
+    if args.compare:
+        compare(json.load(open(args.compare, 'r', encoding='utf-8')), report)
+
+
+def size(n):
+    if n is None:
+        return '-'
+    for unit in ['B', 'KB', 'MB']:
+        if n < 1024:
+            return '%d %s' % (n, unit)
+        n /= 1024
+    return '%.1f GB' % n
+
+
+def compare(base, new):
+    # Ratios new / base of each stage and pass found in both
+    if base['corpus'] != new['corpus']:
+        print("Warning: different corpora", base['corpus'], new['corpus'])
+    base_stages = dict(((s['stage'], s['pass']), s) for s in base['stages'])
+    print("%-28s %-5s %10s %10s %10s" % ('stage', 'pass', 'wall', 'peak RSS', 'written'))
+    for s in new['stages']:
+        b = base_stages.get((s['stage'], s['pass']))
+        if b is None:
+            continue
+        ratios = []
+        for k in ['wall', 'peak_rss_mb', 'wchar']:
+            ratios.append('%9.2fx' % (s[k] / b[k]) if b.get(k) and s.get(k) is not None else '%10s' % '-')
+        print("%-28s %-5s %s" % (s['stage'], s['pass'], ' '.join(ratios)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3:])
+        sys.exit()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Size of the corpus relative to the current numbers of papers, e.g. 1, 10 or 100")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', type=str, default=os.path.join(tempfile.gettempdir(), 'speech_rankings_bench'),
+                        help="Where corpora are generated (and kept for later runs), stages are run and results are "
+                             "written; speech_rankings_bench in the temporary directory by default")
+    parser.add_argument('--stages', type=str,
+                        default='collect_publ_data,collect_ieee_keywords,collect_interspeech_track,'
+                                'filter_non_speech_venue,filter_non_speech_paper,aggregate,collect_author_info,'
+                                'author_index,snapshot,export',
+                        help="Stages of prepare_data.py to run in order, and export for export.py")
+    parser.add_argument('--export-args', type=str, default='', help="Options of export.py")
+    parser.add_argument('--warm', action='store_true', help="Run all stages a second time, with nothing to rebuild")
+    parser.add_argument('--output', type=str, default=None,
+                        help="Results file; <work dir>/results/<scale>x-<time>.json by default")
+    parser.add_argument('--compare', type=str, default=None, help="Results file of an earlier run to compare with")
+    args = parser.parse_args()
+    run(args)
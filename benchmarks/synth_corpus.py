@@ -0,0 +1,271 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+from array import array
+from xml.sax.saxutils import escape, quoteattr
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+from page_cache import PageCache, make_key, url_to_name
+
+# Synthetic corpus for the benchmarks: the responses of DBLP (search API JSON, person XML), IEEE Xplore (document
+# pages with their metadata object) and the ISCA archive (index pages), in the shapes fetch.py parses, stored in
+# <corpus>/cache/pages.sqlite for every request prepare_data.py makes, so that the pipeline runs without network.
+# Scale 1 is about the current number of papers per year of each venue. Titles and years are derived from the paper
+# number, so that only the paper numbers of each author are kept while generating.
+
+papers_per_year = {
+    'SpeechComm': 100, 'TASLP': 350, 'ICASSP': 2800, 'Interspeech': 1100, 'ICML': 1800, 'NeurIPS': 3000,
+    'ICLR': 1800, 'AAAI': 2000, 'IJCAI': 800, 'KDD': 500, 'ACL': 900, 'EMNLP': 1000, 'NAACL': 500,
+    'ACL-Findings': 800, 'EMNLP-Findings': 1000, 'NAACL-Findings': 400, 'SSW': 50, 'ASRU': 200, 'IWSLT': 50,
+    'SLT': 200,
+}
+# Bump when the corpus generated changes, so that corpora kept from earlier runs are regenerated
+corpus_version = 1
+journals = ['SpeechComm', 'TASLP']
+# Share of speech papers at venues that are not speech venues
+speech_share = 0.04
+
+speech_words = ['speech', 'speaker', 'spoken', 'voice', 'acoustic', 'prosody', 'audio', 'asr', 'tts', 'vocoder']
+other_words = ['learning', 'neural', 'graph', 'networks', 'model', 'language', 'retrieval', 'transformer',
+               'representation', 'adaptation', 'robust', 'efficient', 'training', 'inference', 'attention',
+               'generation', 'translation', 'vision', 'reasoning', 'detection', 'radar', 'sensor', 'image',
+               'knowledge', 'multilingual', 'selfsupervised', 'contrastive', 'diffusion', 'semantic', 'sparse']
+title_words = ['towards', 'on', 'for', 'with', 'via', 'using', 'and', 'of', 'in']
+keywords = ['speech recognition', 'natural language processing', 'speaker recognition', 'speech synthesis',
+            'vocoders', 'feature extraction', 'training', 'deep learning', 'signal processing', 'radar',
+            'image coding', 'emotion recognition', 'noise reduction', 'hidden markov models', 'voice conversion']
+tracks = ['Speech Recognition', 'Speech Synthesis', 'Speaker Recognition', 'Paralinguistics', 'Spoken Dialogue',
+          'Speech Enhancement', 'Language Modeling', 'Phonetics', 'Show and Tell', 'Special Session']
+first_names = ['Wei', 'Maria', 'John', 'Yuki', 'Anna', 'Rahul', 'Li', 'David', 'Sofia', 'Hyun', 'Ahmed', 'Elena',
+               'Chen', 'Pierre', 'Olga', 'Kenji', 'Sara', 'Tomas', 'Priya', 'Jun']
+last_names = ['Wang', 'Smith', 'Tanaka', 'Garcia', 'Kim', 'Müller', 'Zhang', 'Rossi', 'Novak', 'Singh', 'Li',
+              'Dubois', 'Ivanova', 'Chen', 'Silva', 'Sato', 'Brown', 'Nguyen', 'Kowalski', 'Hernández']
+affiliations = ['University of Somewhere', 'Institute of Speech, Somecity', 'Big Tech Research', 'Tech University',
+                'National Lab']
+
+
+def paper_hash(seed, n):
+    return hashlib.blake2b(b'%d:%d' % (seed, n), digest_size=16).digest()
+
+
+def paper_title(seed, n, speech):
+    h = paper_hash(seed, n)
+    words = [other_words[b % len(other_words)] for b in h[:5]]
+    if speech:
+        words[h[5] % 5] = speech_words[h[6] % len(speech_words)]
+    words.insert(2, title_words[h[7] % len(title_words)])
+    return ' '.join(words).capitalize() + ' %d' % n
+
+
+def isca_title(seed, n, title):
+    # Most titles are listed as in DBLP, some with small differences, and a few are missing
+    b = paper_hash(seed, n)[8]
+    if b < 8:
+        return None
+    if b < 40:
+        return title[:8] + title[9:]
+    return title
+
+
+def author_name(i):
+    name = '%s %s' % (first_names[i % len(first_names)], last_names[i // len(first_names) % len(last_names)])
+    # Homonyms are told apart by a number, as in DBLP
+    n = i // (len(first_names) * len(last_names))
+    return name if n == 0 else '%s %04d' % (name, n)
+
+
+def author_pid(i):
+    return '%d/%d' % (i % 300, i)
+
+
+class Corpus:
+    def __init__(self, scale=1.0, seed=0):
+        self.scale = scale
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.n_papers = 0
+        self.years = array('h')
+        self.speech = array('b')
+        self.author_papers = {}
+        self.stats = {'dblp_pages': 0, 'ieee_pages': 0, 'isca_pages': 0, 'person_pages': 0, 'publications': 0}
+
+    def put(self, stat, namespace, url, params, text):
+        self.cache.put(make_key(namespace, url_to_name(url, params)), text, commit=False)
+        self.stats[stat] += 1
+
+    def new_paper(self, year, speech, n_authors):
+        n = self.n_papers
+        self.n_papers += 1
+        self.years.append(year)
+        self.speech.append(speech)
+        authors = sorted(set(self.random.choices(self.author_ids, cum_weights=self.author_weights, k=n_authors)))
+        for a in authors:
+            self.author_papers.setdefault(a, array('i')).append(n)
+        return n, authors
+
+    def hit(self, venue, year, n, authors, ee):
+        authors = [{'@pid': author_pid(a), 'text': author_name(a)} for a in authors]
+        key = '%s/%s/%d/%d' % ('journals' if venue in journals else 'conf', venue.lower(), year, n)
+        return {'@score': '1', '@id': str(n),
+                'info': {'authors': {'author': authors[0] if len(authors) == 1 else authors},
+                         'title': paper_title(self.seed, n, self.speech[n]) + '.', 'venue': venue,
+                         'pages': '%d-%d' % (n % 1000, n % 1000 + 4), 'year': str(year),
+                         'type': 'Journal Articles' if venue in journals else 'Conference and Workshop Papers',
+                         'access': 'closed', 'key': key, 'ee': ee, 'url': 'https://dblp.org/rec/' + key},
+                'url': 'https://dblp.org/rec/' + key}
+
+    def ieee_page(self, n):
+        h = paper_hash(self.seed, n)
+        pool = keywords if self.speech[n] else keywords[4:]
+        kwds = [{'type': 'IEEE Keywords', 'kwd': [pool[b % len(pool)] for b in h[9:12]]},
+                {'type': 'INSPEC: Controlled Indexing', 'kwd': [pool[b % len(pool)] for b in h[12:15]]},
+                {'type': 'Author Keywords ', 'kwd': [pool[h[15] % len(pool)]]}]
+        meta = {'authors': [], 'keywords': kwds, 'pubTopics': [{'name': pool[h[9] % len(pool)]}],
+                'htmlAbstractLink': '/document/%d/' % (9000000 + n)}
+        return '<html><head><script>\nxplGlobal.document.metadata=%s;\n</script></head><body></body></html>' % \
+               json.dumps(meta)
+
+    def isca_page(self, papers):
+        sections = {}
+        for n in papers:
+            title = isca_title(self.seed, n, paper_title(self.seed, n, self.speech[n]))
+            if title is not None:
+                sections.setdefault(tracks[paper_hash(self.seed, n)[7] % len(tracks)], []).append(title)
+        html = ['<html><body><div class="w3-container">']
+        for i, (track, titles) in enumerate(sections.items()):
+            html.append('<div class="w3-card">\n%s %d\n' % (escape(track), i % 3 + 1))
+            for j, title in enumerate(titles):
+                html.append('<a href="%s_%d.html" class="w3-text">%s\n<br>Some Authors</a>\n' % (track[:4], j, escape(title)))
+            html.append('</div>')
+        html.append('</div></body></html>')
+        return '\n'.join(html)
+
+    def person_page(self, a, papers):
+        pid, name = author_pid(a), author_name(a)
+        xml = ['<?xml version="1.0" encoding="UTF-8"?>',
+               '<dblpperson name=%s pid=%s n="%d">' % (quoteattr(name), quoteattr(pid), len(papers)),
+               '<person key="homepages/%s" mdate="2024-01-01"><author pid=%s>%s</author>' % (pid, quoteattr(pid), escape(name)),
+               '<note type="affiliation">%s</note>' % escape(affiliations[a % len(affiliations)]),
+               '<url>https://example.org/~%d</url><url>https://orcid.org/0000-%d</url></person>' % (a, a)]
+        # Most recent first, as on DBLP
+        for n in sorted(papers, key=lambda n: -self.years[n]):
+            title = escape(paper_title(self.seed, n, self.speech[n])) + '.'
+            xml.append('<r><inproceedings key="conf/x/%d" mdate="2024-01-01"><author pid=%s>%s</author>'
+                       '<title>%s</title><year>%d</year></inproceedings></r>' %
+                       (n, quoteattr(pid), escape(name), title, self.years[n]))
+            # Some papers are also listed as preprints
+            if paper_hash(self.seed, n)[8] % 5 == 0:
+                xml.append('<r><article key="journals/corr/abs-%d" mdate="2024-01-01"><author pid=%s>%s</author>'
+                           '<title>%s</title><year>%d</year></article></r>' %
+                           (n, quoteattr(pid), escape(name), title, self.years[n]))
+        xml.append('</dblpperson>')
+        return '\n'.join(xml)
+
+    def generate(self):
+        # Run from the corpus directory, as prepare_data.py reads rules.json and writes cache/ relative to it
+        from prepare_data import patterns, issue_range, issue_year, ieee_venues, rules, start_year, current_year
+        speech_venues = [v for v, c in rules['speech_title'].config.get('venues', {}).items() if c.get('all')]
+
+        n_total = sum(int(papers_per_year[v] * self.scale) for v in patterns) * (current_year - start_year + 1)
+        n_authors = max(100, n_total // 2)
+        # Productivity of authors follows a power law, so that some have many papers
+        self.author_ids = range(n_authors)
+        self.author_weights = list(itertools.accumulate(1 / (i + 10) ** 0.9 for i in range(n_authors)))
+        self.cache = PageCache(os.path.join('cache', 'pages.sqlite'))
+
+        for venue in patterns:
+            l, r, _ = issue_range(venue)
+            issues = {}
+            for issue in range(l, r):
+                issues.setdefault(issue_year(venue, issue), []).append(issue)
+            for year, year_issues in issues.items():
+                n_year = int(papers_per_year[venue] * self.scale)
+                year_papers = []
+                for k, issue in enumerate(year_issues):
+                    hits = []
+                    for _ in range(n_year // len(year_issues) + (k < n_year % len(year_issues))):
+                        speech = venue in speech_venues or self.random.random() < speech_share
+                        n, authors = self.new_paper(year, speech, self.random.randint(1, 8))
+                        if venue in ieee_venues:
+                            ee = 'https://doi.org/10.1109/%s.%d.%d' % (venue, year, n)
+                            self.put('ieee_pages', 'ieee', ee, {}, self.ieee_page(n))
+                        elif venue == 'Interspeech':
+                            ee = 'https://doi.org/10.21437/Interspeech.%d-%d' % (year, n)
+                        else:
+                            ee = 'https://doi.org/10.5555/%d' % n
+                        hits.append(self.hit(venue, year, n, authors, ee))
+                        year_papers.append(n)
+                    if venue not in journals:
+                        key = 'conf/%s/%d' % (venue.lower(), year)
+                        hits.append({'@score': '1', '@id': key, 'url': 'https://dblp.org/rec/' + key,
+                                     'info': {'title': 'Proceedings of %s %d' % (venue, year), 'venue': venue,
+                                              'year': str(year), 'type': 'Editorship', 'key': key,
+                                              'ee': 'https://doi.org/10.5555/%s' % key,
+                                              'url': 'https://dblp.org/rec/' + key}})
+                    self.put_search(patterns[venue], issue, hits)
+                    self.stats['publications'] += len(hits)
+                if venue == 'Interspeech':
+                    self.put('isca_pages', 'isca', 'https://www.isca-archive.org/interspeech_%d/index.html' % year, {},
+                             self.isca_page(year_papers))
+            self.cache.commit()
+
+        # Only authors with enough papers get their person page fetched
+        for a, papers in self.author_papers.items():
+            if len(papers) >= 10:
+                self.put('person_pages', 'responses', 'https://dblp.uni-trier.de/pid/' + author_pid(a) + '.xml', {},
+                         self.person_page(a, papers))
+        self.cache.commit()
+        return self.stats
+
+    def put_search(self, pattern, issue, hits):
+        # Result pages of 1000 hits, as requested by fetch.get_dblp_page
+        key = pattern % issue if isinstance(pattern, str) else pattern(issue)
+        for first in range(0, max(len(hits), 1), 1000):
+            page = hits[first: first + 1000]
+            hits_json = {'@total': str(len(hits)), '@computed': str(len(hits)), '@sent': str(len(page)),
+                         '@first': str(first)}
+            if page:
+                hits_json['hit'] = page
+            params = {'q': key, 'format': 'json', 'h': 1000, 'f': first}
+            self.put('dblp_pages', 'responses', 'https://dblp.org/search/publ/api', params,
+                     json.dumps({'result': {'query': key, 'status': {'@code': '200', 'text': 'OK'}, 'hits': hits_json}}))
+
+
+def corpus_stamp(scale, seed):
+    return {'version': corpus_version, 'scale': scale, 'seed': seed}
+
+
+def generate(path, scale=1.0, seed=0):
+    # Generates the corpus into path unless it is there already; returns its stats
+    stamp_path = os.path.join(path, 'corpus.json')
+    if os.path.exists(stamp_path):
+        stamp = json.load(open(stamp_path, 'r', encoding='utf-8'))
+        if stamp['corpus'] == corpus_stamp(scale, seed):
+            return stamp['stats']
+        shutil.rmtree(path)
+    os.makedirs(path)
+    for name in ['rules.json']:
+        shutil.copy(os.path.join(root, name), path)
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        stats = Corpus(scale, seed).generate()
+    finally:
+        os.chdir(cwd)
+    json.dump({'corpus': corpus_stamp(scale, seed), 'stats': stats}, open(stamp_path, 'w', encoding='utf-8'))
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', type=str, help="Directory of the corpus")
+    parser.add_argument('--scale', type=float, default=1.0, help="Papers relative to the current numbers per year")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(generate(args.path, args.scale, args.seed), indent=1))
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import publ_store
+
+# Publication counts by author pid, venue and year, with side tables of counts by ISCA track and IEEE keyword,
+# stored as sparse (COO) tables. Any ranking over a selection of venues and years is a mask and a sum over these,
+# without touching the publications. Every row also keeps the rank of its first publication, in descending year
+# order stable w.r.t. publications.json, so that ties are broken as export.py does. For rankings on deduplicated
+# counts, where a paper (see paper_index.py) counts once, at its first version among the publications selected,
+# rows also keep the count and first rank of publications of papers with a single version ("_ucount", "_ufirst");
+# the (few) publications of papers with several versions are listed in "versions_*" and added to these rows once
+# the selection, hence their first versions, is known.
+# Columns are stored in the narrowest integer type that holds them, and pids and names as UTF-8 blobs, which are
+# loaded as publ_store.Strings.
+
+cube_file = 'cube.npz'
+cube_vocab_file = 'cube_vocab.json'
+
+
+def expand_ranges(starts, lengths):
+    # Concatenation of range(s, s + l) for each s, l, and the position within each range
+    pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + pos, pos
+
+
+def narrow(a, smallest=np.int8):
+    # a in the narrowest integer type, from smallest up to int64, that holds its values
+    for dtype in [np.int8, np.int16, np.int32]:
+        info = np.iinfo(dtype)
+        if info.bits >= np.iinfo(smallest).bits and (len(a) == 0 or info.min <= a.min() and a.max() <= info.max):
+            return a.astype(dtype)
+    return a.astype(np.int64)
+
+
+def group_sum(keys, count, first, inverse=False):
+    # Unique rows of keys (a list of arrays), with the sum of count and the min of first over each; with inverse,
+    # also the row of each item
+    idx = np.lexsort(keys[::-1])
+    keys, count, first = [k[idx] for k in keys], count[idx], first[idx]
+    if len(idx) == 0:
+        return (keys, count, first, idx) if inverse else (keys, count, first)
+    change = np.zeros(len(idx), dtype=bool)
+    change[0] = True
+    for k in keys:
+        change[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(change)
+    result = [k[starts] for k in keys], np.add.reduceat(count, starts), np.minimum.reduceat(first, starts)
+    if not inverse:
+        return result
+    rows = np.empty(len(idx), dtype=np.int64)
+    rows[idx] = np.cumsum(change) - 1
+    return result + (rows,)
+
+
+def make_predicate(year_start=None, year_end=None, venues=None, exclude_venues=()):
+    def predicate(venue, year):
+        return (year_start is None or year >= year_start) and (year_end is None or year <= year_end) and \
+               (venues is None or venue in venues) and venue not in exclude_venues
+    return predicate
+
+
+def select(predicate, venues, venue, year):
+    # Evaluates predicate(venue name, year) once per distinct (venue, year) of the arrays
+    if predicate is None:
+        return np.ones(len(venue), dtype=bool)
+    if len(venue) == 0:
+        return np.zeros(0, dtype=bool)
+    # (venue, year) packed into one integer, as np.unique is much faster on those than on rows
+    pairs, inverse = np.unique(venue.astype(np.int64) << 16 | year.astype(np.int64), return_inverse=True)
+    allowed = np.array([bool(predicate(venues[p >> 16], p & 0xffff)) for p in pairs.tolist()], dtype=bool)
+    return allowed[inverse.reshape(-1)]
+
+
+class CountCube:
+    def __init__(self, data, vocab):
+        self.data = data
+        self.vocab = dict(vocab)
+        for name in ['pids', 'names']:
+            if not isinstance(vocab[name], publ_store.Strings):
+                self.vocab[name] = publ_store.Strings(vocab[name])
+        self._pid_ids = None
+
+    @property
+    def pid_ids(self):
+        # {pid: id}, only built when a single author is looked up
+        if self._pid_ids is None:
+            self._pid_ids = dict((pid, i) for i, pid in enumerate(self.vocab['pids']))
+        return self._pid_ids
+
+    def ids(self, pids):
+        # Ids of pids (-1 for those without publications), in one pass over the pids of the cube
+        positions = self.vocab['pids'].positions(pids)
+        ids = np.full(len(pids), -1, dtype=np.int64)
+        found = positions >= 0
+        ids[positions[found]] = np.nonzero(found)[0]
+        return ids
+
+    @classmethod
+    def from_columns(cls, columns, vocab):
+        n = len(columns['year'])
+        order = np.argsort(-columns['year'], kind='stable')
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+
+        pids, names, pid_ids = [], [], {}
+        author_pid = np.empty(len(vocab['authors']), dtype=np.int64)
+        for i, (pid, name) in enumerate(vocab['authors']):
+            if pid not in pid_ids:
+                pid_ids[pid] = len(pids)
+                pids.append(pid)
+                names.append(name)
+            author_pid[i] = pid_ids[pid]
+        del pid_ids
+        a_pub = np.repeat(np.arange(n), np.diff(columns['authors_offsets']))
+        a_author = author_pid[columns['authors']]
+        a_venue, a_year, a_rank = columns['venue'][a_pub], columns['year'][a_pub], rank[a_pub]
+        ones = np.ones(len(a_pub), dtype=np.int64)
+
+        data = {}
+        # Publications of papers with several versions, in the order of publications.json
+        paper = columns['paper'] if 'paper' in columns else np.full(n, -1, dtype=np.int32)
+        papers, n_versions = np.unique(paper[paper >= 0], return_counts=True)
+        multi = np.isin(paper, papers[n_versions > 1]) & (paper >= 0)
+        version = np.full(n, -1, dtype=np.int64)
+        version[multi] = np.arange(multi.sum())
+        for name, column in [('paper', paper), ('venue', columns['venue']), ('year', columns['year'])]:
+            data['versions_' + name] = narrow(column[multi], np.int32 if name == 'paper' else np.int8)
+        a_version = version[a_pub]
+
+        def add_table(table, keys, count, first, item_version):
+            # Rows without publications of single-version papers have a ucount of 0 and a ufirst above all ranks;
+            # items of other publications are kept with their row, version and rank
+            rows, count_, first_, item_row = group_sum(keys, count, first, inverse=True)
+            for name, k in zip(['author', 'venue', 'year', 'value'], rows):
+                data[table + '_' + name] = narrow(k)
+            single = item_version < 0
+            ucount = np.bincount(item_row[single], minlength=len(count_))
+            ufirst = np.full(len(count_), first.max() + 1 if len(first) else 0, dtype=np.int64)
+            np.minimum.at(ufirst, item_row[single], first[single])
+            # Counts are summed over rows, hence at least int32
+            for name, column in [('count', count_), ('first', first_), ('ucount', ucount), ('ufirst', ufirst),
+                                 ('dup_row', item_row[~single]), ('dup_version', item_version[~single]),
+                                 ('dup_first', first[~single])]:
+                data[table + '_' + name] = narrow(column, np.int32)
+
+        add_table('pubs', [a_author, a_venue, a_year], ones, a_rank, a_version)
+
+        track = columns['track'][a_pub]
+        m = track >= 0
+        add_table('tracks', [a_author[m], a_venue[m], a_year[m], track[m]], ones[m], a_rank[m], a_version[m])
+
+        offsets = columns['keywords_offsets']
+        lengths = offsets[a_pub + 1] - offsets[a_pub]
+        k_index, k_pos = expand_ranges(offsets[a_pub], lengths)
+        width = int(k_pos.max()) + 1 if len(k_pos) else 1
+        add_table('keywords', [np.repeat(a_author, lengths), np.repeat(a_venue, lengths), np.repeat(a_year, lengths),
+                               columns['keywords'][k_index]], np.ones(len(k_index), dtype=np.int64),
+                  np.repeat(a_rank, lengths) * width + k_pos, np.repeat(a_version, lengths))
+
+        return cls(data, {'pids': pids, 'names': names, 'venues': list(vocab['venues']),
+                          'tracks': list(vocab['tracks']), 'keywords': list(vocab['keywords'])})
+
+    def save(self, path=publ_store.store_path):
+        np.savez(os.path.join(path, cube_file), **self.data, **self.vocab['pids'].arrays('pids'),
+                 **self.vocab['names'].arrays('names'))
+        vocab = dict((k, v) for k, v in self.vocab.items() if k not in ['pids', 'names'])
+        json.dump(vocab, open(os.path.join(path, cube_vocab_file), 'w', encoding='utf-8'), ensure_ascii=False)
+
+    @classmethod
+    def exists(cls, path=publ_store.store_path):
+        return os.path.exists(os.path.join(path, cube_file))
+
+    @classmethod
+    def load(cls, path=publ_store.store_path):
+        with np.load(os.path.join(path, cube_file), allow_pickle=False) as f:
+            data = dict(f.items())
+        vocab = json.load(open(os.path.join(path, cube_vocab_file), 'r', encoding='utf-8'))
+        # Cubes saved before pids and names were moved to cube_file have them in the vocab
+        for name in ['pids', 'names']:
+            if name not in vocab:
+                vocab[name] = publ_store.Strings.from_arrays(data.pop(name), data.pop(name + '_offsets'))
+        return cls(data, vocab)
+
+    def mask(self, table, predicate=None, authors=None):
+        # Rows of a table in the (venue, year) selected by predicate, and of authors (a bool array over pids)
+        m = select(predicate, self.vocab['venues'], self.data[table + '_venue'], self.data[table + '_year'])
+        if authors is not None:
+            m &= authors[self.data[table + '_author']]
+        return m
+
+    def count_columns(self, table, dedup, predicate=None):
+        # Columns of counts and first ranks, of all publications or, with dedup, of the first version of each paper
+        # among the publications in the (venue, year) selected by predicate only
+        if not dedup:
+            return self.data[table + '_count'], self.data[table + '_first']
+        if table + '_ucount' not in self.data:
+            raise ValueError("No deduplicated counts in the cube, rebuild it with cube.py --build")
+        data = self.data
+        selected = select(predicate, self.vocab['venues'], data['versions_venue'], data['versions_year'])
+        counted = publ_store.first_versions(data['versions_paper'], selected)[data[table + '_dup_version']]
+        rows = data[table + '_dup_row'][counted]
+        count = data[table + '_ucount'] + np.bincount(rows, minlength=len(data[table + '_ucount']))
+        first = np.array(data[table + '_ufirst'], dtype=np.int64)
+        np.minimum.at(first, rows, data[table + '_dup_first'][counted])
+        return count, first
+
+    def totals(self, predicate=None, dedup=False):
+        # Number of publications of each pid
+        m = self.mask('pubs', predicate)
+        count, _ = self.count_columns('pubs', dedup, predicate)
+        return np.bincount(self.data['pubs_author'][m], weights=count[m],
+                           minlength=len(self.vocab['pids'])).astype(np.int64)
+
+    def counts(self, table, by, predicate=None, authors=None, dedup=False):
+        # Counts per (pid, by) where by is 'venue', 'year' or 'value'; returns pid, by, count, and the rank of
+        # the first publication
+        count, first = self.count_columns(table, dedup, predicate)
+        m = self.mask(table, predicate, authors) & (count > 0)
+        (author, value), count, first = group_sum([self.data[table + '_author'][m], self.data[table + '_' + by][m]],
+                                                  count[m], first[m])
+        return author, value, count, first
+
+    def top(self, n=None, predicate=None, dedup=False):
+        totals = self.totals(predicate, dedup)
+        candidates = np.nonzero(totals)[0]
+        candidates = candidates[np.argsort(-totals[candidates], kind='stable')][:n]
+        return [(self.vocab['pids'][c], self.vocab['names'][c], int(totals[c])) for c in candidates.tolist()]
+
+    def author(self, pid, predicate=None, dedup=False):
+        # Counts of a single author by venue, year, ISCA track and IEEE keyword
+        authors = np.zeros(len(self.vocab['pids']), dtype=bool)
+        authors[self.pid_ids[pid]] = True
+        result = {}
+        for name, table, by, labels in [('venue', 'pubs', 'venue', self.vocab['venues']),
+                                        ('year', 'pubs', 'year', None),
+                                        ('track', 'tracks', 'value', self.vocab['tracks']),
+                                        ('keyword', 'keywords', 'value', self.vocab['keywords'])]:
+            _, value, count, _ = self.counts(table, by, predicate, authors, dedup)
+            result[name] = sorted([(labels[v] if labels is not None else v, c)
+                                   for v, c in zip(value.tolist(), count.tolist())], key=lambda x: -x[1])
+        return result
+
+
+def build_cube(path=publ_store.store_path):
+    columns, vocab = publ_store.load_columns(path=path)
+    cube = CountCube.from_columns(columns, vocab)
+    cube.save(path)
+    return cube
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--build', action='store_true', help="(Re)build the cube from the publications store")
+    parser.add_argument('--year-start', type=int, default=None)
+    parser.add_argument('--year-end', type=int, default=None)
+    parser.add_argument('--venues', type=str, default=None, help="Only count these venues")
+    parser.add_argument('--exclude-venue', type=str, default="", help="Do not count these venues")
+    parser.add_argument('--top', type=int, default=20, help="Number of authors listed")
+    parser.add_argument('--pid', type=str, default=None, help="Show the counts of this author instead")
+    parser.add_argument('--dedup', action='store_true', help="Count each paper once, at its first version")
+    args = parser.parse_args()
+
+    cube = build_cube() if args.build or not CountCube.exists() else CountCube.load()
+    predicate = make_predicate(args.year_start, args.year_end, args.venues.split(',') if args.venues else None,
+                               args.exclude_venue.split(','))
+    if args.pid is not None:
+        if args.pid not in cube.pid_ids:
+            sys.exit("Unknown pid %s: no publications in the cube" % args.pid)
+        print(json.dumps(cube.author(args.pid, predicate, args.dedup), ensure_ascii=False, indent=1))
+    else:
+        for i, (pid, name, count) in enumerate(cube.top(args.top, predicate, args.dedup)):
+            print("%d\t%d\t%s\t%s" % (i + 1, count, pid, name))
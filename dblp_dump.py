@@ -0,0 +1,91 @@
+import argparse
+import gzip
+import html.entities
+import json
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+from fetch import element_text, make_author_info, person_fields
+
+# Author information from a local copy of the DBLP dump (https://dblp.org/xml/dblp.xml.gz), as an alternative to
+# fetching https://dblp.uni-trier.de/pid/<pid>.xml for every author. The dump is streamed with iterparse and every
+# record is dropped once read, so memory only grows with the authors requested. Publications name their authors
+# rather than giving their pids, so a first pass reads the person records (<www key="homepages/<pid>">) to map all
+# names of the authors requested to their pids, and a second pass collects their publications.
+
+record_tags = ['article', 'inproceedings', 'proceedings', 'book', 'incollection', 'phdthesis', 'mastersthesis',
+               'www', 'data']
+
+
+def open_dump(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def iter_records(path):
+    # The character entities of dblp.dtd (&auml; etc.) are those of HTML, so the DTD itself is not needed
+    parser = ET.XMLParser()
+    parser.entity.update(html.entities.entitydefs)
+    with open_dump(path) as f:
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(f, events=('start', 'end'), parser=parser):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                if elem.tag in record_tags:
+                    yield elem
+                root.clear()
+
+
+def read_persons(path, pids):
+    persons = {}
+    for elem in iter_records(path):
+        key = elem.get('key', '')
+        if elem.tag != 'www' or not key.startswith('homepages/') or key[len('homepages/'):] not in pids:
+            continue
+        names, notes, urls = person_fields(elem)
+        persons[key[len('homepages/'):]] = {'names': names, 'notes': notes, 'urls': urls}
+    return persons
+
+
+def read_author_info(path, pids):
+    # Same results as fetch.get_author_info for each pid found in the dump
+    persons = read_persons(path, set(pids))
+    name_to_pid = {}
+    for pid, person in persons.items():
+        for name in person['names']:
+            name_to_pid[name] = pid
+
+    papers = defaultdict(list)
+    for elem in iter_records(path):
+        if elem.tag == 'www' or elem.findtext('year') is None:
+            continue
+        names = [element_text(a) for a in elem.findall('author') + elem.findall('editor')]
+        matched = set(name_to_pid[n] for n in names if n in name_to_pid)
+        if matched:
+            title = element_text(elem.find('title'))
+            for pid in matched:
+                papers[pid].append((int(elem.findtext('year')), title))
+
+    results = {}
+    for pid in pids:
+        if pid not in persons:
+            print("Not in the dump:", pid)
+            continue
+        person = persons[pid]
+        # Most recent first, as on the person pages
+        results[pid] = make_author_info(pid, person['names'][0], person['notes'], person['urls'],
+                                        sorted(papers[pid], key=lambda p: -p[0]))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dump', type=str, help="Path to dblp.xml or dblp.xml.gz")
+    parser.add_argument('pids', type=str, nargs='+')
+    args = parser.parse_args()
+    print(json.dumps(read_author_info(args.dump, args.pids), ensure_ascii=False, indent=1))
@@ -1,80 +1,210 @@
 import argparse
-from jinja2 import Template
-from markupsafe import escape
+import os
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 import json
 from collections import defaultdict
 import datetime
 
-def main(args):
-    publs = json.load(open('publications.json', 'r', encoding='utf-8'))
-    authors = json.load(open('authors.json', 'r', encoding='utf-8'))
-    exclude_venue = args.exclude_venue.split(',')
-    publs.sort(key=lambda x: -x['tags']['year'])
+import publ_store
+import snapshot
+import author_store
+from cube import CountCube
+from ranking import AuthorTable
+from records import read_json_list
+from telemetry import telemetry, profile, report_path
+
+# Options of the run rather than of the reports, which are not shown in them nor set per report in batch
+run_options = ['batch', 'workers', 'profile', 'report', 'no_snapshot']
+template_cache_dir = os.path.join('cache', 'jinja')
+report_template = 'template.html'
+client_template = 'template_client.html'
+# Whether to load from the snapshot written by prepare_data.py (see snapshot.py), if fresh; set by --no-snapshot
+use_snapshot = True
+_snapshot_fresh = None
+
+
+def snapshot_fresh():
+    global _snapshot_fresh
+    if _snapshot_fresh is None:
+        _snapshot_fresh = use_snapshot and snapshot.fresh()
+    return _snapshot_fresh
 
+
+def select_publications(args, parts):
+    # parts: (venue, year) of the publications available; returns a predicate on (venue, year)
+    exclude_venue = args.exclude_venue.split(',')
     venue_appearances = defaultdict(set)
-    for publ in publs:
-        if not args.year_start <= publ['tags']['year'] <= args.year_end:
+    for venue, year in parts:
+        if not args.year_start <= year <= args.year_end:
             continue
-        venue_appearances[publ['tags']['venue']].add(publ['tags']['year'])
+        venue_appearances[venue].add(year)
     shift_venues = []
     for venue, years in venue_appearances.items():
         if len(years) == 0 or max(years) < args.year_end:
             shift_venues.append(venue)
 
-    for publ in publs:
-        shift = 1 if publ['tags']['venue'] in shift_venues else 0
-        if not args.year_start - shift <= publ['tags']['year'] <= args.year_end:
-            continue
-        if publ['tags']['venue'] in exclude_venue:
-            continue
-        for a in publ['authors']:
-            pid, name = a['@pid'], a['text']
-            a['pid'] = pid
-            del a['@pid']
-            if pid in authors:
-                if 'tags' not in authors[pid]:
-                    authors[pid]['tags'] = {'Year': defaultdict(int), 'Venue': defaultdict(int),
-                                            'Interspeech': defaultdict(int), 'IEEE': defaultdict(int)}
-                    authors[pid]['pubs'] = []
-                for k, v in publ['tags'].items():
-                    if k == 'year':
-                        bin = 'Year'
-                    elif k == 'venue':
-                        bin = 'Venue'
-                    elif k == 'track':
-                        bin = 'Interspeech'
-                    elif k.startswith('keyword:'):
-                        bin = 'IEEE'
-                        v = k[len('keyword:'):]
-                    authors[pid]['tags'][bin][v] += 1
-                authors[pid]['pubs'].append(publ)
-
-    command = ' '.join(['--%s %s' % (k, v) for k, v in vars(args).items()])
-    authors = [a for a in authors.values() if 'pubs' in a]
-    if args.author_start_year is not None:
-        authors = [a for a in authors if min([int(t) for t in a['years'].keys()]) >= args.author_start_year]
-    authors.sort(key=lambda x: -len(x['pubs']))
-    for i, a in enumerate(authors):
-        if 'google' not in a:
-            a['google'] = "https://www.google.com/search?q=" + a['name'] + " site:scholar.google.com"
-        a['dblp'] = "https://dblp.uni-trier.de/pid/" + a['pid']
-        for tag in a['tags']:
-            a['tags'][tag] = list(a['tags'][tag].items())
-            a['tags'][tag].sort(key=lambda x: -x[1])
-        a['tags']['Year'].sort(key=lambda x: -x[0])
-        a['pubs'] = a['pubs'][:args.n_pubs]
-        a['rank'] = i + 1
-
-        years = list(a['years_dedup'].items())
-        years.sort(key=lambda x: -x[-1])
-        a['years'] = years[:5]
-    authors = authors[args.rank_start: args.rank_end]
-    print(json.dumps([a['name'] for a in authors]))
-
-    tm = Template(open('template.html').read())
-    report = tm.render(authors=authors, command=command,
-                       timestamp=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    open(args.output, 'w', encoding='utf-8').write(report)
+    def selected(venue, year):
+        shift = 1 if venue in shift_venues else 0
+        return args.year_start - shift <= year <= args.year_end and venue not in exclude_venue
+    return selected
+
+
+def load_publications(args=None):
+    # Returns the distinct (venue, year) of all publications, the predicate of those selected by args (None for all),
+    # and the columns of those selected
+    selected = None
+    if snapshot_fresh():
+        parts = snapshot.load_parts()
+        if args is not None:
+            selected = select_publications(args, parts)
+        columns, vocab = snapshot.load_columns(selected)
+    elif publ_store.exists():
+        parts = [(p['venue'], p['year']) for p in publ_store.read_index() if p['n'] > 0]
+        if args is not None:
+            selected = select_publications(args, parts)
+        # With the columnar store, only the partitions selected are read
+        columns, vocab = publ_store.load_columns(selected)
+    else:
+        # publications.json is streamed twice, for the partitions then for the columns, rather than held in memory
+        parts = list(dict.fromkeys((publ['tags']['venue'], publ['tags']['year'])
+                                   for publ in read_json_list('publications.json')))
+        if args is not None:
+            selected = select_publications(args, parts)
+        columns, vocab = publ_store.columns_from_publications(
+            publ for publ in read_json_list('publications.json')
+            if selected is None or selected(publ['tags']['venue'], publ['tags']['year']))
+    return parts, selected, columns, vocab
+
+
+def get_template(name=report_template):
+    # Compiled templates are cached on disk, and only recompiled when the template changes
+    os.makedirs(template_cache_dir, exist_ok=True)
+    env = Environment(loader=FileSystemLoader('.'), bytecode_cache=FileSystemBytecodeCache(template_cache_dir))
+    return env.get_template(name)
+
+
+def stream(tm, path, **context):
+    with open(path, 'w', encoding='utf-8') as f:
+        tm.stream(**context).dump(f)
+
+
+def render(tm, table, args, predicate=None):
+    # Authors are ranked and rendered one at a time, straight into the output; with --page-size, pages of that many
+    # authors are written next to the output, which becomes an index of the pages
+    # Flags and --page-size are only listed when set, so that the default export lists the options it always did
+    command = ' '.join([('--%s' % k if v is True else '--%s %s' % (k, v)) for k, v in vars(args).items()
+                        if k not in run_options and v is not False and not (k == 'page_size' and not v)])
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    selected = table.select(predicate, args.author_start_year, args.rank_start, args.rank_end, args.dedup)
+    if args.data:
+        # The authors are written as compact JSON next to the output, which loads and renders them in the browser
+        data_file = os.path.splitext(args.output)[0] + '.json'
+        data = table.data(selected, predicate, args.n_pubs, args.rank_start, args.dedup)
+        json.dump(data, open(data_file, 'w', encoding='utf-8'), ensure_ascii=False, separators=(',', ':'))
+        stream(tm, args.output, data=os.path.basename(data_file), command=command, timestamp=timestamp)
+        print(json.dumps([a['name'] for a in data['authors']]))
+        return
+    names = []
+
+    def authors(part, rank_start):
+        for a in table.iter_rank(part, predicate, args.n_pubs, rank_start, args.dedup):
+            names.append(a['name'])
+            yield a
+
+    if not args.page_size:
+        stream(tm, args.output, authors=authors(selected, args.rank_start), command=command, timestamp=timestamp)
+    else:
+        base, ext = os.path.splitext(args.output)
+        starts = list(range(0, len(selected), args.page_size))
+        files = ['%s-%d%s' % (base, k + 1, ext) for k in range(len(starts))]
+        links = [os.path.basename(f) for f in files]
+        pages = []
+        for k, start in enumerate(starts):
+            part = selected[start: start + args.page_size]
+            nav = {'index': os.path.basename(args.output), 'prev': links[k - 1] if k > 0 else None,
+                   'next': links[k + 1] if k + 1 < len(starts) else None}
+            n_names = len(names)
+            stream(tm, files[k], authors=authors(part, args.rank_start + start), command=command, timestamp=timestamp,
+                   nav=nav)
+            pages.append({'file': links[k], 'first': args.rank_start + start + 1,
+                          'last': args.rank_start + start + len(part), 'names': names[n_names:]})
+        stream(tm, args.output, authors=[], pages=pages, command=command, timestamp=timestamp)
+    print(json.dumps(names))
+
+
+def load_authors():
+    if snapshot_fresh():
+        return snapshot.load_authors()
+    return author_store.load_authors()
+
+
+def load_cube():
+    # The count cube prebuilt by prepare_data.py, if any
+    if snapshot_fresh():
+        return snapshot.load_cube()
+    if publ_store.exists() and CountCube.exists():
+        return CountCube.load()
+    return None
+
+
+def main(args):
+    with telemetry.timer('export.load_publications'):
+        parts, selected, columns, vocab = load_publications(args)
+    with telemetry.timer('export.load_authors'):
+        authors = load_authors()
+    with telemetry.timer('export.load_template'):
+        tm = get_template(client_template if args.data else report_template)
+    # The cube, if prebuilt, covers all publications, hence the selection is also applied to it
+    with telemetry.timer('export.index'):
+        table = AuthorTable(columns, vocab, authors, load_cube())
+    with telemetry.timer('export.render'):
+        render(tm, table, args, selected)
+
+
+_batch = None
+
+
+def load_batch():
+    # Loaded once per process: all publications, indexed by author, and the compiled templates
+    # Timers of worker processes (with --workers) are not part of the run report
+    global _batch
+    with telemetry.timer('export.load'):
+        parts, _, columns, vocab = load_publications()
+        authors = load_authors()
+        _batch = {'parts': parts, 'table': AuthorTable(columns, vocab, authors, load_cube()),
+                  'template': get_template(report_template), 'client_template': get_template(client_template)}
+
+
+def render_variant(args):
+    tm = _batch['client_template'] if args.data else _batch['template']
+    with telemetry.timer('export.render'):
+        render(tm, _batch['table'], args, select_publications(args, _batch['parts']))
+    return args.output
+
+
+def batch_main(args):
+    # Each configuration overrides the options given on the command line, e.g.
+    # [{"year-start": 2019, "output": "recent.html"}, {"exclude-venue": "", "output": "all.html"}]
+    variants = []
+    for config in json.load(open(args.batch, 'r', encoding='utf-8')):
+        variant = argparse.Namespace(**vars(args))
+        for k, v in config.items():
+            k = k.lstrip('-').replace('-', '_')
+            if k not in vars(args) or k in run_options:
+                raise ValueError("Unknown option %s in %s" % (k, args.batch))
+            setattr(variant, k, v)
+        variants.append(variant)
+
+    if args.workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=load_batch) as executor:
+            for output in executor.map(render_variant, variants):
+                print("Exported", output)
+    else:
+        load_batch()
+        for variant in variants:
+            print("Exported", render_variant(variant))
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -94,8 +224,32 @@ if __name__ == '__main__':
                         help="Include authors ranked from")
     parser.add_argument('--rank-end', type=int, default=200,
                         help="Include authors ranked to")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Rank on deduplicated counts, where papers listed more than once count once")
     parser.add_argument('--output', type=str, default="speech_rankings.html", help="Output file")
+    parser.add_argument('--page-size', type=int, default=0,
+                        help="Authors per page; pages are written as <output>-<n>.html, and the output lists them")
+    parser.add_argument('--data', action='store_true',
+                        help="Write the authors as compact JSON to <output>.json, and make the output a page that "
+                             "renders them as they are scrolled to, and ranks them again for any years and venues")
+    parser.add_argument('--batch', type=str, default=None,
+                        help="JSON file with a list of configurations, each a dict of the options above, "
+                             "to export from a single load of the data")
+    parser.add_argument('--workers', type=int, default=1, help="Processes used to export configurations in batch")
+    parser.add_argument('--profile', type=str, default=None, choices=['cprofile', 'sample'],
+                        help="Profile the run, and add the functions taking most time to the run report")
+    parser.add_argument('--report', type=str, default=None,
+                        help="Run report file; cache/reports/export-<time>.json by default")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="Load from the columnar store and authors.json even if the snapshot is fresh")
 
     args, unparsed = parser.parse_known_args()
     print('unparsed:', unparsed)
-    main(args)
\ No newline at end of file
+    use_snapshot = not args.no_snapshot
+    report = args.report or report_path('export')
+    with profile(args.profile, os.path.splitext(report)[0] + '.prof'):
+        if args.batch is not None:
+            batch_main(args)
+        else:
+            main(args)
+    telemetry.finish(report, args=vars(args))
@@ -1,17 +1,13 @@
-import requests
 import os
 import json
-import urllib
 
-import xmltodict
-from bs4 import BeautifulSoup
 from collections import defaultdict
-from requests import Session
 import random
-import time
-import traceback
+import threading
 
-r = Session()
+from page_cache import PageCache, make_key, url_to_name
+from paper_index import PaperIndex
+from telemetry import telemetry
 
 cache_path = r"cache"
 os.makedirs(cache_path, exist_ok=True)
@@ -26,34 +22,71 @@ def get_headers():
     headers = {'User-Agent': random.choice(user_agents)}
     return headers
 
-def get_page(url, params, cache_dir, do_render=False):
-    os.makedirs(cache_dir, exist_ok=True)
-    key = urllib.parse.quote(url + urllib.parse.urlencode(params), safe="")
-    if os.path.exists(os.path.join(cache_dir, key)):
-        page_text = open(os.path.join(cache_dir, key), encoding="utf-8").read()
+# The page cache and the engine are created by the first thread needing them, under _lock, so that worker threads
+# starting together share one engine, and with it the per-host limits
+_lock = threading.Lock()
+_page_cache = None
+
+def get_page_cache():
+    global _page_cache
+    if _page_cache is None:
+        with _lock:
+            if _page_cache is None:
+                _page_cache = PageCache(os.path.join(cache_path, 'pages.sqlite'))
+    return _page_cache
+
+_engine = None
+
+def get_engine():
+    # All network access goes through one engine, which enforces per-host rate limits and retries with backoff
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from fetch_engine import FetchEngine
+                _engine = FetchEngine(headers=get_headers)
+    return _engine
+
+def get_page(url, params, cache_dir, refresh=False):
+    # refresh: fetch the page again even if it is cached
+    cache = get_page_cache()
+    namespace = os.path.basename(cache_dir)
+    name = url_to_name(url, params)
+    key = make_key(namespace, name)
+    page_text = cache.get(key) if not refresh else None
+    if page_text is not None:
+        telemetry.count('pages.hit.' + namespace)
         return page_text
-    cnt = 0
-    while True:
-        try:
-            page = r.get(url, params=params, headers=get_headers())
-            if do_render:
-                page.html.render()
-            if page.status_code != 200:
-                raise ValueError(page.status_code)
-            page_text = page.content.decode('utf-8')
-            if 'Temporarily Unavailable' in page_text:
-                raise ValueError(f'Temporarily Unavailable ({page.status_code})')
-            open(os.path.join(cache_dir, key), 'w', encoding="utf-8").write(page_text)
-            break
-        except:
-            time.sleep(10)
-            cnt += 1
-            print("Fail to get page", url, params)
-            traceback.print_exc()
-            if cnt > 5:
-                raise ValueError(url)
+    # Pages fetched before the page cache was introduced; see page_cache.py for bulk migration
+    legacy_path = os.path.join(cache_dir, name)
+    if not refresh and os.path.exists(legacy_path):
+        page_text = open(legacy_path, encoding="utf-8").read()
+        cache.put(key, page_text)
+        telemetry.count('pages.legacy_hit.' + namespace)
+        return page_text
+    telemetry.count(('pages.refresh.' if refresh else 'pages.miss.') + namespace)
+    page_text = get_engine().get(url, params)
+    cache.put(key, page_text)
     return page_text
 
+# Bump the version of a parser when its output changes, so that results memoized by get_parsed are discarded
+parser_versions = {'ieee': 1, 'isca': 1}
+
+def get_parsed(url, params, cache_dir, parse):
+    # Parsed results are kept in the page cache next to the raw page, so that re-runs skip parsing altogether
+    cache = get_page_cache()
+    namespace = os.path.basename(cache_dir)
+    key = make_key('%s.parsed.%d' % (namespace, parser_versions[namespace]), url_to_name(url, params))
+    text = cache.get(key)
+    if text is not None:
+        telemetry.count('parsed.hit.' + namespace)
+        return json.loads(text)
+    page = get_page(url, params, cache_dir)
+    with telemetry.timer('parse.' + namespace):
+        result = parse(page, url)
+    cache.put(key, json.dumps(result, ensure_ascii=False))
+    return result
+
 def get_dblp_page(url, key):
     params = {'q': key, 'format': 'json', 'h': 1000, 'f': 0}
     result = []
@@ -65,27 +98,36 @@ def get_dblp_page(url, key):
         if int(response['hits']['@sent']) + int(response['hits']['@first']) >= int(response['hits']['@total']):
             break
         params['f'] += 1000
-        time.sleep(2)
     return result
 
 def get_ieee_meta(url):
-    page = get_page(url, {}, os.path.join(cache_path, 'ieee'))
-    ml = None
-    for l in page.splitlines():
-        l = l.strip('\t')
-        if l.startswith('xplGlobal.document.metadata='):
-            ml = l[len('xplGlobal.document.metadata='):]
-            break
-    if ml is None:
+    return get_parsed(url, {}, os.path.join(cache_path, 'ieee'), parse_ieee_meta)
+
+def parse_ieee_meta(page, url):
+    # The metadata object is decoded in place, right after its marker, without splitting the page into lines
+    marker = 'xplGlobal.document.metadata='
+    pos = page.find(marker)
+    if pos < 0:
         raise ValueError(url)
-    meta = json.loads(ml.strip(';'))
+    meta, _ = json.JSONDecoder().raw_decode(page, pos + len(marker))
     topics = [t['name'] for t in meta['pubTopics']]
     meta = {'authors': meta['authors'], 'keywords': meta.get('keywords', []), 'topics': topics, 'id': meta['htmlAbstractLink']}
     return meta
 
+def html_parser():
+    try:
+        import lxml
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
 def get_interspeech_tracks(url):
-    page = get_page(url, {}, os.path.join(cache_path, 'isca'))
-    page = BeautifulSoup(page)
+    return get_parsed(url, {}, os.path.join(cache_path, 'isca'), parse_interspeech_tracks)
+
+def parse_interspeech_tracks(page, url):
+    # Only the sections listing papers are parsed; bs4 is imported here, as runs served from the page cache parse none
+    from bs4 import BeautifulSoup, SoupStrainer
+    page = BeautifulSoup(page, html_parser(), parse_only=SoupStrainer('div', attrs={'class': 'w3-card'}))
 
     tracks = defaultdict(list)
     for sec in page.find_all('div', attrs={'class': 'w3-card'}):
@@ -103,53 +145,69 @@ def get_interspeech_tracks(url):
             tracks[heading].append(name)
     return tracks
 
-def get_author_info(pid):
-    import re
-    url = r"https://dblp.uni-trier.de/pid/" + pid + ".xml"
-    page = get_page(url, {}, os.path.join(cache_path, 'responses'))
-    info = xmltodict.parse(page, force_list=('note', 'url', 'author', 'r'))['dblpperson']
-    papers = info['r']
-    info = info['person']
-    result = {'affiliation': [], 'url': [], 'pid': pid, 'name': info['author'][0]['#text']}
-    exclude_url = ['orcid.org', 'wikidata.org', 'scopus.com', 'researchgate.net', 'semanticscholar.org',
-                   'wikipedia.org', 'isni.org', 'viaf.org', 'id.loc.gov']
-    if 'note' in info:
-        for n in info['note']:
-            if n['@type'] == 'affiliation':
-                afn = n['#text']
-                if '@label' in n:
-                    afn += ' (' + n['@label'] + ')'
-                result['affiliation'].append(afn)
-            else:
-                print(n)
-    if 'url' in info:
-        for url in info['url']:
-            if any([t in url for t in exclude_url]):
-                continue
-            result['url'].append(url)
+exclude_url = ['orcid.org', 'wikidata.org', 'scopus.com', 'researchgate.net', 'semanticscholar.org',
+               'wikipedia.org', 'isni.org', 'viaf.org', 'id.loc.gov']
+
+def element_text(elem):
+    # Text of an element including nested markup, e.g. <i> or <sub> in titles
+    return ''.join(elem.itertext()) if elem is not None else ''
+
+def person_fields(elem):
+    # Names, notes and urls of a DBLP person record, i.e. <person> on person pages or <www key="homepages/..."> in
+    # the dump, as make_author_info takes them
+    notes = []
+    for n in elem.findall('note'):
+        note = {'@type': n.get('type'), '#text': element_text(n)}
+        if n.get('label') is not None:
+            note['@label'] = n.get('label')
+        notes.append(note)
+    return [element_text(a) for a in elem.findall('author')], notes, [element_text(u) for u in elem.findall('url')]
+
+def make_author_info(pid, name, notes, urls, papers):
+    # notes: dicts with '@type', '#text' and optionally '@label' (see person_fields); papers: (year, title) in
+    # the order of the DBLP person page, i.e. most recent first
+    result = {'affiliation': [], 'url': [], 'pid': pid, 'name': name}
+    for n in notes:
+        if n['@type'] == 'affiliation':
+            afn = n['#text']
+            if '@label' in n:
+                afn += ' (' + n['@label'] + ')'
+            result['affiliation'].append(afn)
+        else:
+            print(n)
+    for url in urls:
+        if any([t in url for t in exclude_url]):
+            continue
+        result['url'].append(url)
 
     year_cnt = defaultdict(int)
-    for paper in papers:
-        k = list(paper.keys())[0]
-        assert len(paper.keys()) == 1
-        year = int(paper[k]['year'])
+    for year, title in papers:
         year_cnt[year] += 1
     result['years'] = year_cnt
 
-    # Try to do some deduplication, as the same paper may appear multiple times (e.g. published vs arxiv versions)
+    # Try to do some deduplication, as the same paper may appear multiple times (e.g. published vs arxiv versions);
+    # titles are only compared within the papers of this author
     year_cnt = defaultdict(int)
-    appeared_titles = set()
-    for paper in papers:
-        title = list(paper.values())[0]['title']
-        title = ''.join([(t if t.isalnum() else ' ') for t in title]).strip()
-        title = re.sub(r'\s+', ' ', title.lower())
-        if title in appeared_titles:
+    index = PaperIndex()
+    appeared_papers = set()
+    for year, title in papers:
+        paper = index.paper_id(title)
+        if paper in appeared_papers:
             continue
-        appeared_titles.add(title)
-        k = list(paper.keys())[0]
-        assert len(paper.keys()) == 1
-        year = int(paper[k]['year'])
+        appeared_papers.add(paper)
         year_cnt[year] += 1
     result['years_dedup'] = year_cnt
 
     return result
+
+def get_author_info(pid, refresh=False):
+    url = r"https://dblp.uni-trier.de/pid/" + pid + ".xml"
+    page = get_page(url, {}, os.path.join(cache_path, 'responses'), refresh)
+    import xml.etree.ElementTree as ET
+    root = ET.fromstring(page)
+    papers = []
+    for r in root.findall('r'):
+        assert len(r) == 1
+        papers.append((int(r[0].findtext('year')), element_text(r[0].find('title'))))
+    names, notes, urls = person_fields(root.find('person'))
+    return make_author_info(pid, names[0], notes, urls, papers)
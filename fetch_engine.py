@@ -0,0 +1,160 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+import traceback
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from telemetry import telemetry
+
+# Polite limits per host: sustained requests per second, burst size, and concurrent requests
+host_limits = {
+    'dblp.org': {'rate': 1.0, 'burst': 2, 'concurrency': 2},
+    'dblp.uni-trier.de': {'rate': 1.0, 'burst': 2, 'concurrency': 2},
+    'ieeexplore.ieee.org': {'rate': 4.0, 'burst': 4, 'concurrency': 4},
+    'www.isca-archive.org': {'rate': 2.0, 'burst': 2, 'concurrency': 2},
+}
+default_limit = {'rate': 1.0, 'burst': 1, 'concurrency': 2}
+
+
+class TokenBucket:
+    # Thread-safe: a request reserves a token and is told how long to wait for it
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            return max(0., -self.tokens / self.rate)
+
+
+def parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0., email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class FetchEngine:
+    def __init__(self, limits=None, headers=None, max_retries=5, backoff_base=1., backoff_cap=60., timeout=60.):
+        self.limits = dict(host_limits if limits is None else limits)
+        self.headers = headers or (lambda: {})
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.executor = None
+
+    def host_state(self, host):
+        # Called on the event loop thread only
+        if host not in self.hosts:
+            limit = self.limits.get(host, default_limit)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=limit['concurrency'])
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.hosts[host] = {'session': session, 'bucket': TokenBucket(limit['rate'], limit['burst']),
+                                'semaphore': asyncio.Semaphore(limit['concurrency'])}
+        return self.hosts[host]
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def fetch(self, url, params=None):
+        host = urllib.parse.urlsplit(url).netloc
+        state = self.host_state(host)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            retry_after = None
+            async with state['semaphore']:
+                wait = state['bucket'].reserve()
+                if wait > 0:
+                    telemetry.add_time('fetch.throttled.' + host, wait)
+                await asyncio.sleep(wait)
+                try:
+                    telemetry.count('fetch.requests.' + host)
+                    t = time.perf_counter()
+                    page = await loop.run_in_executor(
+                        self.executor, partial(state['session'].get, url, params=params, headers=self.headers(),
+                                               timeout=self.timeout))
+                    telemetry.observe('fetch.latency.' + host, time.perf_counter() - t)
+                    telemetry.count('fetch.bytes.' + host, len(page.content))
+                    if page.status_code != 200:
+                        telemetry.count('fetch.status_%d.%s' % (page.status_code, host))
+                        retry_after = parse_retry_after(page.headers.get('Retry-After'))
+                        raise ValueError(page.status_code)
+                    page_text = page.content.decode('utf-8')
+                    if 'Temporarily Unavailable' in page_text:
+                        raise ValueError(f'Temporarily Unavailable ({page.status_code})')
+                    return page_text
+                except Exception:
+                    print("Fail to get page", url, params)
+                    traceback.print_exc()
+            attempt += 1
+            if attempt > self.max_retries:
+                telemetry.count('fetch.failed.' + host)
+                raise ValueError(url)
+            telemetry.count('fetch.retries.' + host)
+            delay = self.backoff(attempt, retry_after)
+            telemetry.add_time('fetch.backoff.' + host, delay)
+            await asyncio.sleep(delay)
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                n_workers = sum(l['concurrency'] for l in self.limits.values()) + default_limit['concurrency'] * 4
+                self.executor = ThreadPoolExecutor(max_workers=n_workers)
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        return self.loop
+
+    def submit(self, url, params=None):
+        # Returns a concurrent.futures.Future, usable from any thread
+        params = dict(params) if params else None
+        return asyncio.run_coroutine_threadsafe(self.fetch(url, params), self.start())
+
+    def get(self, url, params=None):
+        return self.submit(url, params).result()
+
+    def get_many(self, requests_):
+        # requests_: iterable of (url, params); exceptions are returned in place of failed pages
+        futures = [self.submit(url, params) for url, params in requests_]
+        results = []
+        for f in futures:
+            try:
+                results.append(f.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        with self.lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.executor.shutdown(wait=False)
+                self.loop = None
@@ -0,0 +1,127 @@
+import argparse
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import urllib.parse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Responses are stored in a single SQLite file, keyed by a hash of the namespace (the old cache sub-directory name,
+# e.g. 'responses', 'ieee', 'isca') and the quoted URL + params used as file name by the old flat-file cache.
+# The set of stored keys is loaded once, so that misses never touch the disk.
+
+
+def make_key(namespace, name):
+    return hashlib.sha1((namespace + '\0' + name).encode('utf-8')).digest()[:16]
+
+
+def url_to_name(url, params):
+    return urllib.parse.quote(url + urllib.parse.urlencode(params), safe="")
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=5, mtime=0)
+    return data
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Page stored with zstd, but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+
+class PageCache:
+    def __init__(self, path, codec=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.codec = codec or default_codec()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages (key BLOB PRIMARY KEY, codec TEXT, data BLOB) '
+                          'WITHOUT ROWID')
+        self.conn.commit()
+        self.index = set(k for k, in self.conn.execute('SELECT key FROM pages'))
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        if key not in self.index:
+            return None
+        with self.lock:
+            row = self.conn.execute('SELECT codec, data FROM pages WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return decompress(row[1], row[0]).decode('utf-8')
+
+    def put(self, key, text, commit=True):
+        data = compress(text.encode('utf-8'), self.codec)
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?)', (key, self.codec, data))
+            if commit:
+                self.conn.commit()
+            self.index.add(key)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+
+def migrate(cache, cache_root, namespaces, remove=False):
+    # Import the old flat-file trees (cache/responses, cache/ieee, cache/isca) into the page cache
+    for ns in namespaces:
+        legacy_dir = os.path.join(cache_root, ns)
+        if not os.path.isdir(legacy_dir):
+            continue
+        n_imported = 0
+        for entry in os.scandir(legacy_dir):
+            if not entry.is_file():
+                continue
+            key = make_key(ns, entry.name)
+            if key not in cache:
+                cache.put(key, open(entry.path, encoding='utf-8').read(), commit=False)
+                n_imported += 1
+                if n_imported % 1000 == 0:
+                    cache.commit()
+            if remove:
+                os.remove(entry.path)
+        cache.commit()
+        print("%s: %d pages imported" % (ns, n_imported))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['migrate', 'stats'])
+    parser.add_argument('--cache-root', type=str, default='cache', help="Root of the old cache directories")
+    parser.add_argument('--namespaces', type=str, default='responses,ieee,isca',
+                        help="Old cache sub-directories to import")
+    parser.add_argument('--codec', type=str, default=None, choices=['zstd', 'gzip', 'none'],
+                        help="Compression of imported pages; zstd if available, otherwise gzip")
+    parser.add_argument('--remove', action='store_true', help="Remove the old files after importing")
+    args = parser.parse_args()
+
+    cache = PageCache(os.path.join(args.cache_root, 'pages.sqlite'), args.codec)
+    if args.command == 'migrate':
+        migrate(cache, args.cache_root, args.namespaces.split(','), args.remove)
+    print("%d pages in %s" % (len(cache), cache.path))
@@ -0,0 +1,55 @@
+import hashlib
+import re
+import threading
+
+# Identity of papers listed more than once, e.g. as published and preprint versions, or in two venues. A paper is
+# known by signatures: a hash of its normalized title (optionally together with its set of authors), and a hash of
+# its DOI if it has one. A publication gets the id of the first paper it shares a signature with, or a new id, in
+# constant time.
+
+
+def dedup_title(title):
+    title = ''.join([(t if t.isalnum() else ' ') for t in title]).strip()
+    return re.sub(r'\s+', ' ', title.lower())
+
+
+def doi(url):
+    m = re.match(r'https?://(?:dx\.)?doi\.org/(.+)', url or '')
+    return m.group(1).lower() if m else None
+
+
+def digest(*parts):
+    return hashlib.sha1('\0'.join(parts).encode('utf-8')).digest()[:12]
+
+
+class PaperIndex:
+    def __init__(self, authors=False):
+        # authors: papers with the same title are only the same if they also have the same authors
+        self.authors = authors
+        self.ids = {}
+        self.n_papers = 0
+        self.lock = threading.Lock()
+
+    def signatures(self, title, authors=(), url=None):
+        if self.authors:
+            signatures = [digest('title', dedup_title(title), *sorted(authors))]
+        else:
+            signatures = [digest('title', dedup_title(title))]
+        d = doi(url)
+        if d is not None:
+            signatures.append(digest('doi', d))
+        return signatures
+
+    def paper_id(self, title, authors=(), url=None):
+        signatures = self.signatures(title, authors, url)
+        with self.lock:
+            for s in signatures:
+                if s in self.ids:
+                    paper = self.ids[s]
+                    break
+            else:
+                paper = self.n_papers
+                self.n_papers += 1
+            for s in signatures:
+                self.ids.setdefault(s, paper)
+        return paper
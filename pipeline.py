@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+
+# Bookkeeping for incremental rebuilds of prepare_data.py. Each stage output is split into partitions, normally
+# "<venue>/<year>". For every partition the manifest keeps the fingerprint of what it was built from, and the
+# fingerprint of what it contains, which is in turn the input of downstream partitions.
+
+
+def fingerprint(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(json.dumps(p, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def partition(venue, year):
+    return '%s/%s' % (venue, year)
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            self.entries = json.load(open(path, 'r', encoding='utf-8'))
+        else:
+            self.entries = {}
+
+    def get(self, stage, part):
+        return self.entries.get(stage, {}).get(part)
+
+    def set(self, stage, part, inputs, output):
+        self.entries.setdefault(stage, {})[part] = {'inputs': inputs, 'output': output}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        json.dump(self.entries, open(tmp_path, 'w', encoding='utf-8'), ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class Run:
+    def __init__(self, manifest, venues=None, force=(), dry_run=False, queue=None, retry_failed=False):
+        # queue: the WorkQueue of items that may fail on their own; retry_failed: only redo the failed ones
+        self.manifest = manifest
+        self.venues = venues
+        self.force = set(force)
+        self.dry_run = dry_run
+        self.queue = queue
+        self.retry_failed = retry_failed
+        self.dirty = set()  # (stage, part) that were, or in a dry run would be, rebuilt
+
+    def select(self, venues):
+        return [v for v in venues if self.venues is None or v in self.venues]
+
+    def output(self, stage, part):
+        entry = self.manifest.get(stage, part)
+        return entry['output'] if entry else None
+
+    def needs(self, stage, part, inputs=None, upstream=(), exists=True, unfinished=False):
+        # inputs=None: the partition has no local inputs (e.g. fetched data), so it is only built once;
+        # upstream: (stage, part) it is derived from, only consulted in dry runs as nothing is rebuilt then;
+        # unfinished: items of the partition were left pending or failed by an earlier run
+        entry = self.manifest.get(stage, part)
+        stale = stage in self.force or not exists or entry is None or unfinished or \
+                (inputs is not None and entry['inputs'] != inputs)
+        if self.dry_run and any(u in self.dirty for u in upstream):
+            stale = True
+        if stale:
+            if self.dry_run and (stage, part) not in self.dirty:
+                print("Would rebuild %s: %s" % (stage, part))
+            self.dirty.add((stage, part))
+        return stale and not self.dry_run
+
+    def done(self, stage, part, inputs, output):
+        self.manifest.set(stage, part, inputs, output)
@@ -1,44 +1,43 @@
+import argparse
+import json
 import os
-from collections import defaultdict
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-import tqdm
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import partial
 import time
 import datetime
 import html
 import traceback as tb
-import re
 
-import unidecode
-import pandas as pd
-
-from fetch import *
+from fetch import cache_path, get_author_info, get_dblp_page, get_ieee_meta, get_interspeech_tracks
+from pipeline import Manifest, Run, fingerprint, partition
+from records import read_records, write_records, file_fingerprint, list_years, write_json_list
+from rules import load_rules
+from title_match import TitleIndex, MatchReport
+from dblp_dump import read_author_info
+from author_store import AuthorStore
+from paper_index import PaperIndex
+from work_queue import WorkQueue, states
+from telemetry import telemetry, profile, report_path
 
 current_year = datetime.date.today().year
 start_year = current_year - 10
 
-def read_series(issue_start, issue_end, pattern, name, issue_to_year=None):
+def read_issue(pattern, issue):
     base_url = r"https://dblp.org/search/publ/api"
-    results = defaultdict(list)
-    for issue in tqdm.trange(issue_start, issue_end, desc=name):
-        if isinstance(pattern, str):
-            key = pattern % issue
+    if isinstance(pattern, str):
+        key = pattern % issue
+    else:
+        key = pattern(issue)
+    result = get_dblp_page(base_url, key)
+    for i in range(len(result)):
+        item = result[i]['info']
+        if 'title' in item:
+            item['title'] = html.unescape(item['title'])
         else:
-            key = pattern(issue)
-        result = get_dblp_page(base_url, key)
-        if not result:
-            continue
-        for i in range(len(result)):
-            item = result[i]['info']
-            if 'title' in item:
-                item['title'] = html.unescape(item['title'])
-            else:
-                print("Missing title:", item['url'])
-        result = [r for r in result if 'title' in r['info']]
-        if issue_to_year is not None:
-            issue = issue_to_year(issue)
-        results[issue].extend(result)
-    return results
+            print("Missing title:", item['url'])
+    return [r for r in result if 'title' in r['info']]
 
 
 patterns = {
@@ -76,126 +75,352 @@ patterns = {
 }
 
 
+def issue_range(key):
+    if key == "SpeechComm":
+        l, r = 55, 164  # 2014~2024
+
+        def issue_to_year(issue):
+            if 18 <= issue <= 47:
+                year = 2005 - (47 - issue) // 3
+            elif 48 <= issue <= 55:
+                year = 2013 - (55 - issue)
+            elif issue > 55:
+                year = (issue - 55) // 10 + 2014
+            else:
+                raise ValueError("Unsupported issue %d" % issue)
+            return year
+    elif key == "TASLP":
+        l, r = 22, current_year - 1992 + 1
+
+        def issue_to_year(issue):
+            return 2021 - (29 - issue)
+    else:
+        l, r = start_year, current_year + 1
+        issue_to_year = None
+    return l, r, issue_to_year
+
+
+def issue_year(key, issue):
+    issue_to_year = issue_range(key)[2]
+    return issue_to_year(issue) if issue_to_year else issue
+
+
+def partition_path(stage_dir, venue, year):
+    return os.path.join(cache_path, stage_dir, venue, '%s.jsonl' % year)
+
+
+def has_records(path):
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+def venue_years(stage_dir, venue):
+    # Per-venue JSON files of earlier versions are split into partitions the first time they are read
+    legacy_path = os.path.join(cache_path, stage_dir, '%s.json' % venue)
+    if os.path.exists(legacy_path) and not os.path.isdir(os.path.join(cache_path, stage_dir, venue)):
+        for year, items in json.load(open(legacy_path, 'r', encoding='utf-8')).items():
+            write_records(partition_path(stage_dir, venue, year), items)
+    return list_years(os.path.join(cache_path, stage_dir, venue))
+
+
+def read_partition(stage_dir, venue, year):
+    return read_records(partition_path(stage_dir, venue, year))
+
+
+def iter_publications():
+    # Aggregated publications in the order of publications.json, read one partition at a time
+    for venue in patterns:
+        for year in venue_years('publ_agg', venue):
+            yield from read_partition('publ_agg', venue, year)
+
+
+# Bump the version of a stage when its code changes, so that its outputs get rebuilt
+stage_versions = {'collect_ieee_keywords': 3, 'collect_interspeech_track': 3, 'filter_non_speech_venue': 2,
+                  'filter_non_speech_paper': 3, 'aggregate': 5, 'collect_author_info': 1, 'author_index': 1,
+                  'snapshot': 1}
+
+
+# Kinds of the items of each stage in run.queue, by default only its partitions (see rebuild_partitions)
+stage_kinds = {'collect_publ_data': ['dblp_issue'], 'collect_ieee_keywords': ['collect_ieee_keywords', 'ieee_document']}
+
+
+def queue_kinds(stage):
+    return stage_kinds.get(stage, [stage])
+
+
+def unfinished_years(run, stages, venue):
+    # Years of venue with items of these stages left pending or failed in run.queue
+    return set(part.split('/', 1)[1] for s in stages for k in queue_kinds(s) for part, _ in run.queue.items(k)
+               if part.startswith(venue + '/'))
+
+
+def rebuild_partitions(run, stage, src_stage, src_dir, dst_dir, venue, build, config=(), joins=()):
+    # Rebuild the stale years of one venue from the output of an upstream stage; build(year, records) is given
+    # the records of the source partition as an iterator, and may return any iterable of records. joins: other
+    # stages whose partition of the same year is read by build. A partition whose build fails is left as it was and
+    # recorded as failed, and the other partitions go on. So is a partition whose upstream partitions have work left
+    # in run.queue, which would otherwise be built from incomplete data, or dropped if missing upstream.
+    src_years = venue_years(src_dir, venue)
+    old_years = set(venue_years(dst_dir, venue))
+    blocked = unfinished_years(run, [src_stage] + list(joins), venue)
+    for year in sorted(blocked, key=int):
+        print("%s %s: left as it was, work left upstream" % (venue, year))
+        if not run.dry_run:
+            run.queue.failed(stage, partition(venue, year), '', 'Work left upstream')
+    for year in src_years:
+        if year in blocked:
+            continue
+        part = partition(venue, year)
+        inputs = fingerprint(stage_versions[stage], config, run.output(src_stage, part),
+                             *[run.output(j, part) for j in joins])
+        upstream = [(s, part) for s in [src_stage] + list(joins)]
+        # Partitions left unfinished are rebuilt, with --retry-failed only those with failures (or stale inputs)
+        unfinished = any(run.queue.unfinished(k, part, run.retry_failed) for k in queue_kinds(stage))
+        if run.needs(stage, part, inputs, upstream=upstream, exists=year in old_years, unfinished=unfinished):
+            try:
+                output = write_records(partition_path(dst_dir, venue, year),
+                                       build(year, read_partition(src_dir, venue, year)))
+            except Exception as e:
+                tb.print_exc()
+                run.queue.failed(stage, part, '', repr(e))
+                continue
+            run.queue.done(stage, part, '')
+            run.done(stage, part, inputs, output)
+    run.queue.commit()
+    # Years no longer in the source are dropped
+    if not run.dry_run:
+        for year in old_years.difference(src_years).difference(blocked):
+            os.remove(partition_path(dst_dir, venue, year))
+        # Partitions held back by an earlier run whose year is no longer upstream are done with
+        for year in unfinished_years(run, [stage], venue).difference(src_years).difference(blocked):
+            run.queue.done(stage, partition(venue, year), '')
+        run.queue.commit()
+
+
+# Stages whose outputs publications.json is built from
+publ_stages = ['collect_publ_data', 'collect_ieee_keywords', 'collect_interspeech_track', 'filter_non_speech_venue',
+               'filter_non_speech_paper', 'aggregate']
+
+
+def held_back(run, output):
+    # publications.json and the outputs built from it are not updated while work on the partitions is left in
+    # run.queue, unless --allow-incomplete is given
+    left = [k for s in publ_stages for k in queue_kinds(s) if run.queue.unfinished(k)]
+    if left and not allow_incomplete:
+        print("%s not updated, work left: %s; rerun, or use --allow-incomplete" % (output, ', '.join(left)))
+        return True
+    return False
+
+
 # Consider past 20 years by default
-def collect_publ_data():
-    cache_dir = os.path.join(cache_path, 'publ_all')
-    os.makedirs(cache_dir, exist_ok=True)
-    for key in patterns:
-        if key == "SpeechComm":
-            l, r = 55, 164  # 2014~2024
-
-            def issue_to_year(issue):
-                if 18 <= issue <= 47:
-                    year = 2005 - (47 - issue) // 3
-                elif 48 <= issue <= 55:
-                    year = 2013 - (55 - issue)
-                elif issue > 55:
-                    year = (issue - 55) // 10 + 2014
-                else:
-                    raise ValueError("Unsupported issue %d" % issue)
-                return year
-        elif key == "TASLP":
-            l, r = 22, current_year - 1992 + 1
-
-            def issue_to_year(issue):
-                return 2021 - (29 - issue)
+def collect_publ_data(run):
+    # (venue, issue) work items of all venues are fetched concurrently; the DBLP request rate is bounded by the
+    # fetch engine, and each year is written in issue order once all of its issues are in, so the output does not
+    # depend on completion order and only the issues of unfinished years are held in memory
+    work = []
+    for key in run.select(patterns):
+        l, r, _ = issue_range(key)
+        for year in venue_years('publ_all', key):
+            path = partition_path('publ_all', key, year)
+            if has_records(path) and run.output('collect_publ_data', partition(key, year)) is None:
+                run.done('collect_publ_data', partition(key, year), None, file_fingerprint(path))
+
+        # Years already collected are kept; missing or empty years, and years with issues left pending or failed by
+        # an earlier run, are (re-)collected
+        for i in range(l, r):
+            part = partition(key, issue_year(key, i))
+            if run.needs('collect_publ_data', part,
+                         exists=has_records(partition_path('publ_all', key, issue_year(key, i))),
+                         unfinished=run.queue.unfinished('dblp_issue', part, run.retry_failed)):
+                work.append((key, i))
+    if run.retry_failed:
+        # Years are written whole, so all issues of a year with a failed one are done again (others from the cache)
+        failed = set(part for part, _ in run.queue.items('dblp_issue', states=['failed']))
+        work = [(key, i) for key, i in work if partition(key, issue_year(key, i)) in failed]
+    if not work:
+        return
+    for key, issue in work:
+        run.queue.add('dblp_issue', partition(key, issue_year(key, issue)), str(issue))
+    run.queue.commit()
+
+    year_issues = defaultdict(list)
+    for key, issue in work:
+        year_issues[(key, issue_year(key, issue))].append(issue)
+    remaining = dict((k, set(issues)) for k, issues in year_issues.items())
+
+    import tqdm
+    executor = ThreadPoolExecutor(max_workers=16)
+    futures = {executor.submit(read_issue, patterns[key], issue): (key, issue) for key, issue in work}
+    results = {}
+    failures = defaultdict(list)
+    for f in tqdm.tqdm(as_completed(futures), total=len(futures), desc='DBLP issues'):
+        key, issue = futures[f]
+        year = issue_year(key, issue)
+        try:
+            results[(key, issue)] = f.result()
+            run.queue.done('dblp_issue', partition(key, year), str(issue))
+        except Exception as e:
+            print("Failed: %s issue %d (%s)" % (key, issue, e))
+            failures[key].append(issue)
+            run.queue.failed('dblp_issue', partition(key, year), str(issue), repr(e))
+        remaining[(key, year)].discard(issue)
+        if remaining[(key, year)]:
+            continue
+        # A year is only updated if all of its issues were fetched
+        issues = year_issues[(key, year)]
+        if all((key, i) in results for i in issues):
+            path = partition_path('publ_all', key, year)
+            output = write_records(path, (r for i in issues for r in results.pop((key, i))))
+            if has_records(path):
+                run.done('collect_publ_data', partition(key, year), None, output)
         else:
-            l, r = start_year, current_year + 1
-            issue_to_year = None
+            for i in issues:
+                results.pop((key, i), None)
+    executor.shutdown()
+    run.queue.commit()
+
+    for key in run.select(patterns):
+        issues = [i for k, i in work if k == key]
+        if not issues:
+            continue
+        print("%s: %d issues fetched, failed: %s" % (key, len(issues) - len(failures[key]), sorted(failures[key])))
+        print("Missing in %s:" % key, [k for k in range(start_year, current_year + 1)
+                                       if not has_records(partition_path('publ_all', key, k))])
 
-        results = read_series(l, r, patterns[key], key, issue_to_year)
 
-        print("Missing in %s:" % key, [k for k in range(start_year, current_year + 1) if k not in results or len(results[k]) == 0])
-        json.dump(results, open(os.path.join(cache_dir, '%s.json' % key), 'w', encoding='utf-8'), ensure_ascii=False,
-                  indent=1)
+# Title and keyword rules of the filters, see rules.py
+rules = load_rules()
+mixed_venues = ['TASLP', 'ICASSP']
+ieee_venues = ['ICASSP', 'TASLP', 'ASRU', 'SLT']
 
 
-def filter_non_speech_venue():
-    speech_venues = ['TASLP', 'SpeechComm', 'Interspeech', 'ICASSP', 'SSW', 'ASRU', 'IWSLT', 'SLT']
-    cache_dir = os.path.join(cache_path, 'publ_filtered')
-    os.makedirs(cache_dir, exist_ok=True)
-    for k in patterns:
-        if os.path.exists(os.path.join(cache_path, 'publ_ex', '%s.json' % k)):
-            publ = json.load(open(os.path.join(cache_path, 'publ_ex', '%s.json' % k), 'r', encoding='utf-8'))
-        else:
-            publ = json.load(open(os.path.join(cache_path, 'publ_all', '%s.json' % k), 'r', encoding='utf-8'))
-        if k not in speech_venues:
-            years = list(publ.keys())
-            for year in years:
-                print(k, year)
-                results = []
-                for item in publ[year]:
-                    title = item['info'].get('title', '').lower()
-                    title = ''.join([(t if t.isalnum() else ' ') for t in title ]).strip()
-                    title = re.sub(r'\s+', ' ', title)
-                    if ('speech' in title or ' asr ' in title or ' tts ' in title or 'speaker' in title or 'prosody' in title or 'audio' in title or 'voice' in title or 'waveform' in title or 'acoustic' in title or 'spoken' in title) \
-                            and not ('hate' in title or 'part of speech' in title or 'wavelet' in title or 'imaging' in title or 'parts of speech' in title or 'part of speech' in title or 'invited speakers' in title or 'keynote speaker' in title or 'speaker commitment' in title or 'native speaker' in title or 'waveform inversion' in title or 'blood' in title):
-                        print(item['info']['title'])
-                        results.append(item)
-                publ[year] = results
-        json.dump(publ, open(os.path.join(cache_dir, '%s.json' % k), 'w', encoding='utf-8'), ensure_ascii=False,
-                  indent=1)
-
-def collect_ieee_keywords():
-    ieee_venues = ['ICASSP', 'TASLP', 'ASRU', 'SLT']
-    cache_dir = os.path.join(cache_path, 'publ_ex')
-    os.makedirs(cache_dir, exist_ok=True)
-    executor = ThreadPoolExecutor(max_workers=4)
-
-    for k in ieee_venues:
-        publ = json.load(open(os.path.join(cache_path, 'publ_all', '%s.json' % k), 'r', encoding='utf-8'))
-        years = list(publ.keys())
-        for year in tqdm.tqdm(years, desc=k):
-            if int(year) < start_year:
-                continue
+def source_stage(venue):
+    # Enriched data are used when available; IEEE keywords are kept apart, see load_ieee_keywords
+    if venue == 'Interspeech':
+        return 'collect_interspeech_track', 'publ_ex'
+    return 'collect_publ_data', 'publ_all'
 
-            futures = []
-            for item in publ[year]:
-                url = item['info']['ee']
-                title = item['info']['title'].lower().replace('-', '')
-                if item['info']['type'] == 'Editorship':
-                    continue
-                if k in ['ICASSP', 'TASLP']:
-                    keys = [' sensor ', ' point cloud', ' reid', 'beamform', ' mimo ', 'radar', 'signal recovery',
-                            'wireless', 'image compression', 'video compression', 'phase retrieval',
-                            'compressed sensing', '3d', 'super resolution', 'microphone',
-                            'superresolution', 'facial', ' face ', 'coding', 'ctscan', 'ct scan', 'medical',
-                            'broadband', ' dsp ', 'remote sensing', ' array', ' doa ', ' time series ',
-                            'anomaly detection', 'narrowband', 'sparse decomposition', 'matrix decomposition',
-                            'matrix completion']
-                    if any([t in title for t in keys]):
-                        # print("Skip by title:", item['info']['title'])
-                        continue
-                futures.append((item, executor.submit(partial(get_ieee_meta, url))))
-            print("%d/%d papers skipped" % (len(publ[year]) - len(futures), len(publ[year])))
-            for item, f in futures:
-                try:
-                    meta = f.result()
-                except:
-                    tb.print_exc()
-                    print(item['info']['ee'], item['info']['title'])
-                    time.sleep(0.5)
-                    continue
-                keywords = []
-                for kwds in meta['keywords']:
-                    # if 'type' not in kwds or kwds['type'].strip() in ('IEEE Keywords', 'Author Keywords'):
-                    keywords.extend([t.lower().strip(' ').strip('.').replace('-', ' ') for t in kwds['kwd']])
-                keywords = set(keywords)
-                item['info']['keywords'] = list(keywords)
-                item['info']['ieee_meta'] = meta
-            # print("Appeared keywords:", kw_count.keys())
-        json.dump(publ, open(os.path.join(cache_dir, '%s.json' % k), 'w', encoding='utf-8'), ensure_ascii=False,
-                  indent=1)
-
-
-def collect_interspeech_track():
-    cache_dir = os.path.join(cache_path, 'publ_ex')
-    os.makedirs(cache_dir, exist_ok=True)
-    publ = json.load(open(os.path.join(cache_path, 'publ_all', 'Interspeech.json'), 'r', encoding='utf-8'))
-    years = list(publ.keys())
+
+def filter_non_speech_venue(run):
+    rule = rules['speech_title']
+
+    def build(k, year, items):
+        n_results = n_items = 0
+        for item in items:
+            n_items += 1
+            if rule.match(item['info'].get('title', ''), k):
+                n_results += 1
+                yield item
+        print(k, year, n_results, n_items)
+
+    for k in run.select(patterns):
+        if k in mixed_venues:  # Handled by filter_non_speech_paper
+            continue
+        src_stage, src_dir = source_stage(k)
+        rebuild_partitions(run, 'filter_non_speech_venue', src_stage, src_dir, 'publ_filtered', k,
+                           partial(build, k), rule.venue_config(k))
+    rule.report()
+
+
+# IEEE keywords are stored in cache/ieee_ex/<venue>/<year>.jsonl, one record per enriched paper, keyed by its DBLP
+# key: {"key": ..., "keywords": [[type, [keyword, ...]], ...]}, with each keyword list deduplicated. Types and
+# keywords are ids into the vocabulary cache/ieee_ex/vocab.json, shared by all partitions, which only grows.
+def ieee_vocab_path():
+    return os.path.join(cache_path, 'ieee_ex', 'vocab.json')
+
+
+def load_ieee_vocab():
+    from publ_store import Vocab
+    if not os.path.exists(ieee_vocab_path()):
+        return Vocab()
+    return Vocab(json.load(open(ieee_vocab_path(), 'r', encoding='utf-8')))
+
+
+def save_ieee_vocab(vocab):
+    os.makedirs(os.path.dirname(ieee_vocab_path()), exist_ok=True)
+    tmp_path = ieee_vocab_path() + '.tmp'
+    json.dump(vocab.items, open(tmp_path, 'w', encoding='utf-8'), ensure_ascii=False)
+    os.replace(tmp_path, ieee_vocab_path())
+
+
+def load_ieee_keywords(vocab, venue, year):
+    # {DBLP key: [(type, [keyword, ...]), ...]} of a partition
+    path = partition_path('ieee_ex', venue, year)
+    if not os.path.exists(path):
+        return {}
+    return dict((r['key'], [(vocab.items[t], [vocab.items[k] for k in kwds]) for t, kwds in r['keywords']])
+                for r in read_records(path))
+
+
+def collect_ieee_keywords(run):
+    # Request rates are limited per host by the fetch engine, workers only overlap fetching and parsing. Items are
+    # streamed through a bounded window of requests in flight, and written out in order as they complete.
+    executor = ThreadPoolExecutor(max_workers=8)
+    window = 256
+    skip_rule = rules['ieee_skip_title']
+    vocab = load_ieee_vocab()
+
+    def build(k, year, items):
+        if int(year) < start_year:
+            return []
+        return enrich(k, year, items)
+
+    def enrich(k, year, items):
+        part = partition(k, year)
+        pending = deque()
+        n_items = n_skipped = 0
+        for item in items:
+            n_items += 1
+            url = item['info']['ee']
+            if item['info']['type'] == 'Editorship' or \
+                    (k in mixed_venues and skip_rule.match(item['info']['title'], k)):
+                # print("Skip by title:", item['info']['title'])
+                pending.append((item, None))
+                n_skipped += 1
+            else:
+                pending.append((item, executor.submit(partial(get_ieee_meta, url))))
+            while len(pending) > window or (pending and pending[0][1] is None):
+                record = finish(part, *pending.popleft())
+                if record is not None:
+                    yield record
+        while pending:
+            record = finish(part, *pending.popleft())
+            if record is not None:
+                yield record
+        # Saved before the partition is, so that it never refers to unknown ids
+        save_ieee_vocab(vocab)
+        print("%s %s: %d/%d papers skipped" % (k, year, n_skipped, n_items))
+
+    def finish(part, item, f):
+        # Failed documents are left out of the partition, which is rebuilt by the next run to retry them; documents
+        # done are then read from the parsed results in the page cache
+        if f is None:
+            return None
+        try:
+            meta = f.result()
+        except Exception as e:
+            tb.print_exc()
+            print(item['info']['ee'], item['info']['title'])
+            run.queue.failed('ieee_document', part, item['info']['ee'], repr(e))
+            return None
+        run.queue.done('ieee_document', part, item['info']['ee'])
+        keywords = []
+        for kwds in meta['keywords']:
+            keywords.append([vocab[kwds.get('type', '').strip()], [vocab[t] for t in dict.fromkeys(kwds['kwd'])]])
+        return {'key': item['info']['key'], 'keywords': keywords}
+
+    import tqdm
+    for k in tqdm.tqdm(run.select(ieee_venues)):
+        rebuild_partitions(run, 'collect_ieee_keywords', 'collect_publ_data', 'publ_all', 'ieee_ex', k,
+                           partial(build, k), skip_rule.venue_config(k) if k in mixed_venues else [])
+    skip_rule.report()
+
+
+def collect_interspeech_track(run):
+    # Titles are matched exactly after normalization, or else approximately, see title_match.py; matches of each
+    # year are reported in cache/isca_match/<year>.json
     base_url = r"https://www.isca-archive.org/interspeech_%s/index.html"
-    escapes = {'&quot;': r'"', '²': r"'", '&amp;': '&', '&apos;': r"'", ', 000': ',000', ', ..': ',..'}
-    for year in tqdm.tqdm(years):
+
+    def build(year, items):
         if year == '2002':
             url = r'https://www.isca-archive.org/icslp_2002/index.html'
         elif year == '2003':
@@ -203,132 +428,216 @@ def collect_interspeech_track():
         else:
             url = base_url % year
         tracks = get_interspeech_tracks(url)
-        paper_to_track = {}
+        index = TitleIndex()
         for tr in tracks:
             for pl in tracks[tr]:
-                pl = pl.lower().replace(' : ', ' - ').replace(': ', ' - ').replace(' :', ' - ').replace(':', ' - ')\
-                    .replace('“', '"').replace('”', '"').\
-                    replace('‘', "'").replace("’", "'").replace('—', '-').replace('²', "'").replace('', "'").\
-                    replace('^', '').replace("`", "'").strip(".").replace('  ', ' ')
-                pl = unidecode.unidecode(pl)
-                pl = ''.join([p for p in pl if p.islower()])
-                if pl in paper_to_track:
-                    print("Duplicate:", pl, '|', paper_to_track[pl], '|', tr)
-                paper_to_track[pl] = tr.lower()
-        n_missing = 0
-        for paper in publ[year]:
-            title = paper['info']['title'].lower().strip('.')
-            title = title.replace("Auotmatic", "Automatic") # Some mysterious typo in IS2022
-            for k in escapes:
-                title = title.replace(k, escapes[k])
-            if ' - ' in title and title[0] == '"':
-                pos = title.find('-') - 2
-                if title[pos] == '"':
-                    title = title[1:pos] + title[pos + 1:]
-            title = unidecode.unidecode(title)
-            title = ''.join([p for p in title if p.islower()])
-            if title not in paper_to_track:
-                print("Missing:", paper['info']['title'])
-                n_missing += 1
-                continue
-            paper['info']['isca_track'] = paper_to_track[title]
-        print("Year %s: %d/%d missing" % (year, n_missing, len(publ[year])))
+                previous = index.add(pl, tr.lower())
+                if previous is not None:
+                    print("Duplicate:", pl, '|', previous, '|', tr)
+        report = MatchReport()
+        for paper in items:
+            track, matched, score, exact = index.lookup(paper['info']['title'])
+            report.add(paper['info']['title'], matched, score, exact)
+            if track is not None:
+                paper['info']['isca_track'] = track
+            yield paper
+        print("Year %s: %s" % (year, report.summary()))
         print(tracks.keys())
-    json.dump(publ, open(os.path.join(cache_dir, 'Interspeech.json'), 'w', encoding='utf-8'), ensure_ascii=False,
-              indent=1)
-
-def filter_non_speech_paper():
-    mixed_venues = ['TASLP', 'ICASSP']
-    cache_dir = os.path.join(cache_path, 'publ_filtered')
-    os.makedirs(cache_dir, exist_ok=True)
-    accept_keywords = set(['speech', 'speaker', 'spoken', 'voice', 'asr', 'tts', 'vocoder'])
-    for venue in patterns:
-        if venue in mixed_venues:
-            publ = json.load(open(os.path.join(cache_path, 'publ_ex', '%s.json' % venue), 'r', encoding='utf-8'))
-            years = list(publ.keys())
-            for year in years:
-                results = []
-                kw_count = defaultdict(int)
-                kw_publ = defaultdict(list)
-                publ_kw_count = defaultdict(list)
-
-                for item in publ[year]:
-                    keywords = item['info'].get('keywords', [])
-                    if keywords and any(['natural language' in kw or accept_keywords.intersection(kw.split(' ')) for kw in keywords]):
-                        results.append(item)
-                        continue
-                    if keywords is None:
-                        keywords = ['']
-                    publ_kw_count[len(keywords)].append(item)
-                    for kw in keywords:
-                        kw_count[kw] += 1
-                        kw_publ[kw].append(item['info']['title'])
-                print(venue, year, len(results), len(publ[year]))
-                publ[year] = results
-                if len(results) == 0:
-                    continue
-                kw_publ = list(kw_publ.items())
-                kw_publ.sort(key=lambda x: -len(x[1]))
-            json.dump(publ, open(os.path.join(cache_dir, '%s.json' % venue), 'w', encoding='utf-8'), ensure_ascii=False,
-                      indent=1)
+        report_dir = os.path.join(cache_path, 'isca_match')
+        os.makedirs(report_dir, exist_ok=True)
+        json.dump(report.to_dict(), open(os.path.join(report_dir, '%s.json' % year), 'w', encoding='utf-8'),
+                  ensure_ascii=False, indent=1)
+
+    if run.select(['Interspeech']):
+        rebuild_partitions(run, 'collect_interspeech_track', 'collect_publ_data', 'publ_all', 'publ_ex',
+                           'Interspeech', build)
+
+
+def filter_non_speech_paper(run):
+    rule = rules['speech_keywords']
+    vocab = load_ieee_vocab()
+
+    def build(venue, year, items):
+        ieee_keywords = load_ieee_keywords(vocab, venue, year)
+        n_results = n_items = 0
+        for item in items:
+            n_items += 1
+            keywords = set([t.lower().strip(' ').strip('.').replace('-', ' ')
+                            for _, kwds in ieee_keywords.get(item['info']['key'], []) for t in kwds])
+            if rule.match(list(keywords), venue):
+                n_results += 1
+                yield item
+        print(venue, year, n_results, n_items)
+
+    for venue in run.select(mixed_venues):
+        rebuild_partitions(run, 'filter_non_speech_paper', 'collect_publ_data', 'publ_all', 'publ_filtered',
+                           venue, partial(build, venue), rule.venue_config(venue), joins=['collect_ieee_keywords'])
+    rule.report()
+
+
+def filter_stage(venue):
+    return 'filter_non_speech_paper' if venue in mixed_venues else 'filter_non_speech_venue'
+
 
 exclude_keywords = ["speech processing", "learning (artificial intelligence)", "feature extraction",
                     "conferences", "signal processing", "neural nets", "acoustics", "statistical analysis",
                     "acoustic signal processing", "vectors", "training", "deep learning", "neural networks"]
-def aggregate():
-    results = []
-    for venue in patterns:
-        publ = json.load(open(os.path.join(cache_path, 'publ_filtered', '%s.json' % venue), 'r', encoding='utf-8'))
-        for year in publ:
-            for item in publ[year]:
-                item = item['info']
-                if 'authors' not in item or item['type'] == 'Editorship':
-                    continue
-                authors = item['authors']['author']
-                if isinstance(authors, dict):
-                    authors = [authors]
-                meta = {'title': item['title'], 'key': item['key'], 'url': item['ee'] if 'ee' in item else item['url'],
-                        'authors': authors}
-                tags = {'year': int(year), 'venue': venue}
-                if 'ieee_meta' in item:
-                    keywords = item['ieee_meta']['keywords']
-                    keywords = dict([(t.get('type', '').strip(), t['kwd']) for t in keywords])
-                    kwd = []
-                    if 'INSPEC: Controlled Indexing' in keywords:
-                        kwd.extend(keywords['INSPEC: Controlled Indexing'])
-                    elif 'IEEE Keywords' in keywords:
-                        kwd.extend(keywords['IEEE Keywords'])
-                    if 'Author Keywords' in keywords:
-                        kwd.extend(keywords['Author Keywords'])
-                    kwd = set([k.lower().replace('-', ' ') for k in kwd]).difference(exclude_keywords)
-                    for k in kwd:
-                        tags['keyword:' + k] = ''
-                if 'isca_track' in item:
-                    tags['track'] = item['isca_track']
-                meta['tags'] = tags
-                results.append(meta)
-
-    json.dump(results, open('publications.json', 'w', encoding='utf-8'), ensure_ascii=False,
-              indent=1)
-
-def collect_author_info():
-    publs = json.load(open('publications.json', 'r', encoding='utf-8'))
-    results = {}
+def with_paper_ids(index, publs):
+    # Publications of the same paper, e.g. with the same title and authors in two venues, get the same paper id
+    for publ in publs:
+        publ['paper'] = index.paper_id(publ['title'], [a['@pid'] for a in publ['authors']], publ['url'])
+        yield publ
+
+
+def aggregate(run):
+    vocab = load_ieee_vocab()
+
+    def build(venue, year, items):
+        ieee_keywords = load_ieee_keywords(vocab, venue, year) if venue in ieee_venues else {}
+        for item in items:
+            item = item['info']
+            if 'authors' not in item or item['type'] == 'Editorship':
+                continue
+            authors = item['authors']['author']
+            if isinstance(authors, dict):
+                authors = [authors]
+            meta = {'title': item['title'], 'key': item['key'], 'url': item['ee'] if 'ee' in item else item['url'],
+                    'authors': authors}
+            tags = {'year': int(year), 'venue': venue}
+            if item['key'] in ieee_keywords:
+                keywords = dict(ieee_keywords[item['key']])
+                kwd = []
+                if 'INSPEC: Controlled Indexing' in keywords:
+                    kwd.extend(keywords['INSPEC: Controlled Indexing'])
+                elif 'IEEE Keywords' in keywords:
+                    kwd.extend(keywords['IEEE Keywords'])
+                if 'Author Keywords' in keywords:
+                    kwd.extend(keywords['Author Keywords'])
+                kwd = set([k.lower().replace('-', ' ') for k in kwd]).difference(exclude_keywords)
+                for k in kwd:
+                    tags['keyword:' + k] = ''
+            if 'isca_track' in item:
+                tags['track'] = item['isca_track']
+            meta['tags'] = tags
+            yield meta
+
+    # Publications of each partition are kept in publ_agg, publications.json is only rebuilt when any has changed,
+    # and written one partition at a time
+    for venue in run.select(patterns):
+        rebuild_partitions(run, 'aggregate', filter_stage(venue), 'publ_filtered', 'publ_agg', venue,
+                           partial(build, venue), exclude_keywords,
+                           joins=['collect_ieee_keywords'] if venue in ieee_venues else [])
+
+    if held_back(run, 'publications.json'):
+        return
+    parts = [(venue, year) for venue in patterns for year in venue_years('publ_agg', venue)]
+    inputs = fingerprint(stage_versions['aggregate'], [run.output('aggregate', partition(*p)) for p in parts])
+    if run.needs('aggregate', 'publications.json', inputs, upstream=[('aggregate', partition(*p)) for p in parts],
+                 exists=os.path.exists('publications.json')):
+        # numpy is only imported by the stages needing it, e.g. not by a collection run
+        import publ_store
+        from cube import build_cube
+        # One index for both writers: a publication seen again gets the id it got the first time, so that the store
+        # has the same ids as publications.json
+        index = PaperIndex(authors=True)
+        output = write_json_list('publications.json', with_paper_ids(index, iter_publications()))
+        publ_store.write_partitions((venue, int(year), list(with_paper_ids(index, read_partition('publ_agg', venue, year))))
+                                    for venue, year in parts)
+        build_cube()
+        run.done('aggregate', 'publications.json', inputs, output)
+
+
+# Path of a local DBLP dump to read author information from, instead of fetching a page per author
+dblp_dump = None
+# Write publications.json and the outputs built from it even if work is left on the partitions
+allow_incomplete = False
+# Authors last checked against DBLP more than this many days ago are refreshed; by default, only authors whose
+# number of publications here changed are
+author_max_age = None
+
+
+def collect_author_info(run):
+    # Author information is kept in cache/authors.sqlite (see author_store.py) and authors.json is exported from it
+    if held_back(run, 'authors.json'):
+        return
+    store = AuthorStore(os.path.join(cache_path, 'authors.sqlite'))
+    stamps = store.stamps()
+    now = time.time()
+
+    def expired(pid):
+        return author_max_age is not None and now - stamps[pid][1] > author_max_age * 86400
+
+    dump_stamp = dblp_dump and '%d-%d' % (os.path.getsize(dblp_dump), os.path.getmtime(dblp_dump))
+    inputs = fingerprint(stage_versions['collect_author_info'], run.output('aggregate', 'publications.json'), dump_stamp)
+    # Authors left pending or failed by earlier runs are done again; with --retry-failed, only failed ones are
+    unfinished = run.queue.unfinished('author', retry_failed=run.retry_failed)
+    needed = run.needs('collect_author_info', 'authors.json', inputs, upstream=[('aggregate', 'publications.json')],
+                       exists=os.path.exists('authors.json'), unfinished=unfinished)
+    if run.dry_run or not (needed or any(expired(pid) for pid in stamps)):
+        return
     # df = pd.read_csv('csrankings.csv') # Not used, since almost all authors are not in CSRankings
+    import tqdm
     n_csr = 0
     paper_cnt = defaultdict(int)
 
-    for publ in tqdm.tqdm(publs):
+    for publ in tqdm.tqdm(iter_publications()):
         for author in publ['authors']:
             pid = author['@pid']
             paper_cnt[pid] += 1
 
     target_pids = [k for k in paper_cnt if paper_cnt[k] >= 10]
-    executor = ThreadPoolExecutor(max_workers=2)
-    futures = [(pid, executor.submit(partial(get_author_info, pid))) for pid in target_pids]
 
-    for pid, f in tqdm.tqdm(futures):
-        info = f.result()
+    def stamp(pid):
+        return 'n=%d' % paper_cnt[pid] + (';dump=%s' % dump_stamp if dblp_dump is not None else '')
+
+    # authors.json of earlier versions is taken as up to date
+    if not stamps and os.path.exists('authors.json'):
+        for pid, info in json.load(open('authors.json', 'r', encoding='utf-8')).items():
+            store.put(pid, stamp(pid), info, now, commit=False)
+        store.commit()
+        stamps = store.stamps()
+
+    new_pids = [pid for pid in target_pids if pid not in stamps]
+    stale_pids = [pid for pid in target_pids if pid in stamps and (stamps[pid][0] != stamp(pid) or expired(pid))]
+    if run.retry_failed:
+        # Authors new to the queue, e.g. of the publications of retried issues, are still fetched
+        failed = set(pid for _, pid in run.queue.items('author', states=['failed']))
+        known = set(pid for _, pid in run.queue.items('author', states=states))
+        new_pids = [pid for pid in new_pids if pid in failed or pid not in known]
+        stale_pids = [pid for pid in stale_pids if pid in failed]
+    for pid in new_pids + stale_pids:
+        run.queue.add('author', 'authors.json', pid)
+    run.queue.commit()
+    print("%d new and %d stale authors, %d up to date" % (len(new_pids), len(stale_pids),
+                                                          len(target_pids) - len(new_pids) - len(stale_pids)))
+    if dblp_dump is not None:
+        # The dump is only read if some author is to be updated, as that takes two passes over all of it
+        infos = read_author_info(dblp_dump, new_pids + stale_pids) if new_pids or stale_pids else {}
+        fetched = [(pid, infos.get(pid, ValueError("Not in the dump"))) for pid in new_pids + stale_pids]
+    else:
+        # Stale authors bypass the page cache, as their DBLP page may have changed
+        executor = ThreadPoolExecutor(max_workers=8)
+        futures = [(pid, executor.submit(partial(get_author_info, pid))) for pid in new_pids] + \
+                  [(pid, executor.submit(partial(get_author_info, pid, refresh=True))) for pid in stale_pids]
+
+        def results():
+            for pid, f in futures:
+                try:
+                    yield pid, f.result()
+                except Exception as e:
+                    tb.print_exc()
+                    yield pid, e
+        fetched = results()
+
+    # Authors are committed to the store as they come, in batches, so that a crash keeps those already fetched
+    n_changed = n_failed = 0
+    for i, (pid, info) in enumerate(tqdm.tqdm(fetched, total=len(new_pids) + len(stale_pids))):
+        if i % 100 == 99:
+            store.commit()
+        if isinstance(info, Exception):
+            run.queue.failed('author', 'authors.json', pid, repr(info))
+            n_failed += 1
+            continue
         for url in info['url']:
             if 'scholar.google.com' in url:
                 info['google'] = url
@@ -340,20 +649,112 @@ def collect_author_info():
         #     info['google'] = "https://scholar.google.com/citations?user=" + row['scholarid']
         #     n_csr += 1
 
-        results[pid] = info
-
-    print("Total %d authors, %d in CSRankings" % (len(target_pids), n_csr))
-    json.dump(results, open('authors.json', 'w', encoding='utf-8'), ensure_ascii=False,
-              indent=1)
+        n_changed += store.put(pid, stamp(pid), info, commit=False)
+        run.queue.done('author', 'authors.json', pid)
+    store.commit()
+    run.queue.commit()
+
+    print("Total %d authors, %d changed, %d failed, %d in CSRankings" % (len(target_pids), n_changed, n_failed, n_csr))
+    output = store.export(target_pids, 'authors.json')
+    run.done('collect_author_info', 'authors.json', inputs, output)
+
+
+def build_author_index(run):
+    # Memory-mapped index of authors.json for queries by pid, name, affiliation and years (see author_index.py)
+    import author_index
+    if held_back(run, 'author_index'):
+        return
+    if not os.path.exists('authors.json'):
+        print("No author index without authors.json")
+        return
+    inputs = fingerprint(stage_versions['author_index'], run.output('collect_author_info', 'authors.json'))
+    if run.needs('author_index', 'author_index', inputs, upstream=[('collect_author_info', 'authors.json')],
+                 exists=author_index.fresh()):
+        author_index.build_index()
+        run.done('author_index', 'author_index', inputs, None)
+
+
+def write_snapshot(run):
+    # Snapshot of the columnar store, its cube and authors.json that export.py loads memory-mapped (see snapshot.py)
+    import publ_store
+    import snapshot
+    from cube import CountCube
+    if held_back(run, 'snapshot'):
+        return
+    if not (publ_store.exists() and CountCube.exists() and os.path.exists('authors.json')):
+        print("No snapshot without the columnar store and authors.json")
+        return
+    inputs = fingerprint(stage_versions['snapshot'], run.output('aggregate', 'publications.json'),
+                         run.output('collect_author_info', 'authors.json'))
+    if run.needs('snapshot', 'snapshot', inputs, upstream=[('aggregate', 'publications.json'),
+                                                           ('collect_author_info', 'authors.json')],
+                 exists=snapshot.fresh()):
+        snapshot.write()
+        run.done('snapshot', 'snapshot', inputs, None)
+
+
+stages = {
+    'collect_publ_data': collect_publ_data,
+    'collect_ieee_keywords': collect_ieee_keywords,
+    'collect_interspeech_track': collect_interspeech_track,
+    'filter_non_speech_venue': filter_non_speech_venue,
+    'filter_non_speech_paper': filter_non_speech_paper,
+    'aggregate': aggregate,
+    'collect_author_info': collect_author_info,
+    'author_index': build_author_index,
+    'snapshot': write_snapshot,
+}
 
 if __name__ == '__main__':
-    collect_publ_data()
-    collect_ieee_keywords()
-    collect_interspeech_track()
-
-    filter_non_speech_venue()
-    filter_non_speech_paper()
-
-    aggregate()
-
-    collect_author_info()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stages', type=str, default=','.join(stages),
+                        help="Stages to run, in pipeline order; all by default")
+    parser.add_argument('--venues', type=str, default=None, help="Venues to process; all by default")
+    parser.add_argument('--force', action='store_true',
+                        help="Rebuild all partitions of the selected stages, even if they are up to date")
+    parser.add_argument('--dry-run', action='store_true', help="Only show what would be rebuilt")
+    parser.add_argument('--dblp-rate', type=float, default=None,
+                        help="Max DBLP requests per second, shared by all workers")
+    parser.add_argument('--dblp-dump', type=str, default=None,
+                        help="Read author information from this dblp.xml(.gz) instead of fetching it per author")
+    parser.add_argument('--author-max-age', type=float, default=None,
+                        help="Refresh authors last checked more than this many days ago")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Only redo the items that failed in earlier runs (see work_queue.py)")
+    parser.add_argument('--allow-incomplete', action='store_true',
+                        help="Write publications.json and the later outputs even if items of earlier stages are left "
+                             "pending or failed, from the partitions as they are")
+    parser.add_argument('--profile', type=str, default=None, choices=['cprofile', 'sample'],
+                        help="Profile the run, and add the functions taking most time to the run report")
+    parser.add_argument('--report', type=str, default=None,
+                        help="Run report file; cache/reports/prepare_data-<time>.json by default")
+    args = parser.parse_args()
+
+    dblp_dump = args.dblp_dump
+    author_max_age = args.author_max_age
+    allow_incomplete = args.allow_incomplete
+
+    if args.dblp_rate is not None:
+        from fetch_engine import host_limits
+        host_limits['dblp.org']['rate'] = args.dblp_rate
+
+    selected = args.stages.split(',')
+    for s in selected:
+        if s not in stages:
+            raise ValueError("Unknown stage %s" % s)
+    venues = args.venues.split(',') if args.venues else None
+    queue = WorkQueue(os.path.join(cache_path, 'work_queue.sqlite'))
+    run = Run(Manifest(os.path.join(cache_path, 'manifest.json')), venues,
+              selected if args.force else (), args.dry_run, queue, args.retry_failed)
+    report = args.report or report_path('prepare_data')
+    with profile(args.profile, os.path.splitext(report)[0] + '.prof'):
+        for name, stage in stages.items():
+            if name in selected:
+                with telemetry.timer('stage.' + name):
+                    stage(run)
+                if not args.dry_run:
+                    run.manifest.save()
+    queue.report()
+    telemetry.finish(report, args=vars(args))
+    if queue.failures():
+        sys.exit(1)
@@ -0,0 +1,271 @@
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+
+# Columnar copy of publications.json, written by aggregate() and read by export.py. Publications are partitioned
+# by (venue, year) into <path>/<venue>/<year>.npz, so that only the partitions needed are read. Strings are stored
+# as a UTF-8 blob with offsets; authors (pid and name), ISCA tracks and IEEE keywords are ids into the vocab, kept in
+# vocab.json but for authors, which are kept in authors.npz as blobs of pids and names, and loaded as such.
+# index.json lists the partitions in the order of publications.json, together with their sizes. Publications
+# carry the id of the paper they are a version of (see paper_index.py); which version comes first depends on the
+# publications selected, see first_versions.
+
+store_path = 'publications'
+string_fields = ['title', 'key', 'url']
+vocab_fields = ['authors', 'tracks', 'keywords', 'venues']
+
+
+class Vocab:
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.ids = dict((item, i) for i, item in enumerate(self.items))
+
+    def __getitem__(self, item):
+        if item not in self.ids:
+            self.ids[item] = len(self.items)
+            self.items.append(item)
+        return self.ids[item]
+
+
+def encode_strings(strings):
+    data = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum([len(d) for d in data], out=offsets[1:])
+    return np.frombuffer(b''.join(data), dtype=np.uint8), offsets
+
+
+def decode_string(blob, offsets, i):
+    return blob[offsets[i]:offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class Strings:
+    # A list of strings kept as one UTF-8 blob with offsets, i.e. two objects instead of one per string
+    __slots__ = ['blob', 'offsets']
+
+    def __init__(self, strings=()):
+        blob, offsets = encode_strings(strings)
+        self.blob, self.offsets = blob.tobytes(), array('q', offsets.tobytes())
+
+    @classmethod
+    def from_arrays(cls, blob, offsets):
+        strings = cls.__new__(cls)
+        strings.blob, strings.offsets = blob.tobytes(), array('q', offsets.astype(np.int64).tobytes())
+        return strings
+
+    def arrays(self, name):
+        return {name: np.frombuffer(self.blob, dtype=np.uint8), name + '_offsets': np.frombuffer(self.offsets,
+                                                                                                 dtype=np.int64)}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        blob, offsets = self.blob, self.offsets
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+    def positions(self, strings):
+        # Position in strings of each of self (-1 if not there), compared as UTF-8 without decoding self
+        positions = dict((s.encode('utf-8'), i) for i, s in enumerate(strings))
+        blob, offsets = self.blob, self.offsets
+        return np.array([positions.get(blob[offsets[i]:offsets[i + 1]], -1) for i in range(len(offsets) - 1)],
+                        dtype=np.int64)
+
+
+class AuthorVocab:
+    # The (pid, name) of the authors vocab, as Strings of pids and of names
+    __slots__ = ['pids', 'names']
+
+    def __init__(self, pids, names):
+        self.pids = pids
+        self.names = names
+
+    @classmethod
+    def from_list(cls, authors):
+        return cls(Strings([pid for pid, _ in authors]), Strings([name for _, name in authors]))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(Strings.from_arrays(arrays['pids'], arrays['pids_offsets']),
+                   Strings.from_arrays(arrays['names'], arrays['names_offsets']))
+
+    def arrays(self):
+        return dict(self.pids.arrays('pids'), **self.names.arrays('names'))
+
+    def __len__(self):
+        return len(self.pids)
+
+    def __getitem__(self, i):
+        return self.pids[i], self.names[i]
+
+    def __iter__(self):
+        return zip(self.pids, self.names)
+
+    def tolist(self):
+        return [list(a) for a in self]
+
+
+def encode_lists(lists):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(l) for l in lists], out=offsets[1:])
+    return np.array([v for l in lists for v in l], dtype=np.int32), offsets
+
+
+def encode_publications(publs, vocab):
+    # vocab: a Vocab for each of vocab_fields, extended as new items are seen
+    columns = {}
+    for field in string_fields:
+        columns[field], columns[field + '_offsets'] = encode_strings([p[field] for p in publs])
+    columns['authors'], columns['authors_offsets'] = encode_lists(
+        [[vocab['authors'][(a['@pid'], a['text'])] for a in p['authors']] for p in publs])
+    columns['keywords'], columns['keywords_offsets'] = encode_lists(
+        [[vocab['keywords'][k[len('keyword:'):]] for k in p['tags'] if k.startswith('keyword:')] for p in publs])
+    columns['track'] = np.array([vocab['tracks'][p['tags']['track']] if 'track' in p['tags'] else -1 for p in publs],
+                                dtype=np.int32)
+    columns['year'] = np.array([p['tags']['year'] for p in publs], dtype=np.int32)
+    columns['venue'] = np.array([vocab['venues'][p['tags']['venue']] for p in publs], dtype=np.int32)
+    columns['paper'] = np.array([p.get('paper', -1) for p in publs], dtype=np.int32)
+    return columns
+
+
+def first_versions(paper, mask=None):
+    # Rows of mask (all rows if None) that are the first of their paper among the rows of mask, in the order of
+    # publications.json, or have no paper id; these are the publications counted and listed with --dedup
+    first = np.ones(len(paper), dtype=bool) if mask is None else np.array(mask, dtype=bool)
+    rows = np.flatnonzero(first)
+    has_paper = np.flatnonzero(paper[rows] >= 0)
+    _, idx = np.unique(paper[rows[has_paper]], return_index=True)
+    first[rows[has_paper]] = False
+    first[rows[has_paper[idx]]] = True
+    return first
+
+
+def concat_columns(parts):
+    columns = {}
+    for field in parts[0] if parts else []:
+        if field.endswith('_offsets'):
+            continue
+        if field + '_offsets' in parts[0]:
+            offsets, base = [], 0
+            for p in parts:
+                offsets.append(p[field + '_offsets'][:-1] + base)
+                base += len(p[field])
+            columns[field + '_offsets'] = np.concatenate(offsets + [np.array([base], dtype=np.int64)])
+        columns[field] = np.concatenate([p[field] for p in parts])
+    return columns
+
+
+def compact_vocab(vocab):
+    # vocab as read by export.py: lists, but for authors, kept as an AuthorVocab
+    vocab = dict(vocab)
+    vocab['authors'] = AuthorVocab.from_list(vocab['authors'])
+    return vocab
+
+
+def columns_from_publications(publs, chunk_size=10000):
+    # publs: any iterable of publications, encoded chunk_size at a time so that only a chunk of them is held
+    vocab = dict((field, Vocab()) for field in vocab_fields)
+    parts, chunk = [], []
+    for publ in publs:
+        chunk.append(publ)
+        if len(chunk) == chunk_size:
+            parts.append(encode_publications(chunk, vocab))
+            chunk = []
+    if chunk or not parts:
+        parts.append(encode_publications(chunk, vocab))
+    columns = concat_columns(parts) if len(parts) > 1 else parts[0]
+    return columns, compact_vocab(dict((field, vocab[field].items) for field in vocab_fields))
+
+
+def write_partitions(parts, path=store_path):
+    # parts: (venue, year, publications) in the order of publications.json; may be a generator, so that only one
+    # partition is held in memory at a time
+    vocab = dict((field, Vocab()) for field in vocab_fields)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    index = []
+    for venue, year, items in parts:
+        if not items:
+            continue
+        os.makedirs(os.path.join(tmp_path, venue), exist_ok=True)
+        np.savez(os.path.join(tmp_path, venue, '%d.npz' % year), **encode_publications(items, vocab))
+        index.append({'venue': venue, 'year': year, 'n': len(items)})
+
+    np.savez(os.path.join(tmp_path, 'authors.npz'), **AuthorVocab.from_list(vocab['authors'].items).arrays())
+    json.dump(dict((field, vocab[field].items) for field in vocab_fields if field != 'authors'),
+              open(os.path.join(tmp_path, 'vocab.json'), 'w', encoding='utf-8'), ensure_ascii=False)
+    json.dump(index, open(os.path.join(tmp_path, 'index.json'), 'w', encoding='utf-8'), ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def write_publications(publs, path=store_path):
+    parts = {}
+    for publ in publs:
+        parts.setdefault((publ['tags']['venue'], publ['tags']['year']), []).append(publ)
+    write_partitions([(venue, year, items) for (venue, year), items in parts.items()], path)
+
+
+def exists(path=store_path):
+    return os.path.exists(os.path.join(path, 'index.json'))
+
+
+def read_index(path=store_path):
+    return json.load(open(os.path.join(path, 'index.json'), 'r', encoding='utf-8'))
+
+
+def read_vocab(path=store_path):
+    vocab = json.load(open(os.path.join(path, 'vocab.json'), 'r', encoding='utf-8'))
+    if 'authors' in vocab:
+        # Stores written before authors.npz
+        return compact_vocab(vocab)
+    with np.load(os.path.join(path, 'authors.npz'), allow_pickle=False) as f:
+        vocab['authors'] = AuthorVocab.from_arrays(f)
+    return vocab
+
+
+def read_partition(venue, year, path=store_path):
+    with np.load(os.path.join(path, venue, '%d.npz' % year), allow_pickle=False) as f:
+        return dict(f.items())
+
+
+def load_columns(predicate=None, path=store_path):
+    # predicate(venue, year) selects the partitions to load; columns of the partitions are concatenated in the
+    # order of publications.json
+    parts = [read_partition(p['venue'], p['year'], path) for p in read_index(path)
+             if predicate is None or predicate(p['venue'], p['year'])]
+    if not parts:
+        return columns_from_publications([])[0], read_vocab(path)
+    return concat_columns(parts), read_vocab(path)
+
+
+def publication(columns, vocab, i):
+    # The i-th publication, in the format of publications.json
+    tags = {'year': int(columns['year'][i]), 'venue': vocab['venues'][columns['venue'][i]]}
+    offsets = columns['keywords_offsets']
+    for k in columns['keywords'][offsets[i]:offsets[i + 1]]:
+        tags['keyword:' + vocab['keywords'][k]] = ''
+    if columns['track'][i] >= 0:
+        tags['track'] = vocab['tracks'][columns['track'][i]]
+    offsets = columns['authors_offsets']
+    publ = dict((field, decode_string(columns[field], columns[field + '_offsets'], i)) for field in string_fields)
+    publ['authors'] = [{'@pid': vocab['authors'][a][0], 'text': vocab['authors'][a][1]}
+                       for a in columns['authors'][offsets[i]:offsets[i + 1]]]
+    publ['tags'] = tags
+    if 'paper' in columns and columns['paper'][i] >= 0:
+        publ['paper'] = int(columns['paper'][i])
+    return publ
+
+
+def load_publications(predicate=None, path=store_path):
+    columns, vocab = load_columns(predicate, path)
+    return [publication(columns, vocab, i) for i in range(len(columns['year']))]
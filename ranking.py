@@ -0,0 +1,178 @@
+import numpy as np
+
+from author_store import Author
+from cube import CountCube, select
+from publ_store import Vocab, decode_string, first_versions
+
+# Author rankings and badges for export.py. Counts come from a CountCube, and the publications listed from the
+# author-publication table. Publications are ordered by descending year, stable w.r.t. publications.json, and all
+# ties (badges with equal counts, authors with equal numbers of publications) are broken in the same way as the
+# per-publication loop export.py used before.
+
+
+def explode(columns, vocab, authors):
+    # Author-publication table of authors in authors.json: (author position in authors, publication rank),
+    # ordered by publication rank then author position in the publication
+    n = len(columns['year'])
+    order = np.argsort(-columns['year'], kind='stable').astype(np.int32)
+    rank = np.empty(n, dtype=np.int32)
+    rank[order] = np.arange(n)
+
+    author_pos = vocab['authors'].pids.positions(authors).astype(np.int32)
+    a_author = author_pos[columns['authors']]
+    a_pub = rank[np.repeat(np.arange(n), np.diff(columns['authors_offsets']))]
+    mask = a_author >= 0
+    a_author, a_pub = a_author[mask], a_pub[mask]
+    idx = np.argsort(a_pub, kind='stable')
+    return order, a_author[idx], a_pub[idx]
+
+
+def group_lists(author, value, count, labels):
+    result = {}
+    for a, v, c in zip(author.tolist(), value.tolist(), count.tolist()):
+        result.setdefault(a, []).append((labels[v] if labels is not None else v, c))
+    return result
+
+
+def sort_counts(author, value, count, first):
+    # Within each author, most frequent first, then by first appearance
+    idx = np.lexsort((first, -count, author))
+    return author[idx], value[idx], count[idx]
+
+
+class AuthorTable:
+    # Rankings for any selection of (venue, year), from counts by author, venue and year. authors: {pid: Author}
+    # as loaded by author_store.load_authors, or the records of authors.json
+    def __init__(self, columns, vocab, authors, cube=None):
+        self.columns = columns
+        self.vocab = vocab
+        self.authors = dict((pid, a if isinstance(a, Author) else Author(a)) for pid, a in authors.items())
+        self.author_list = list(authors)
+        self.cube = cube if cube is not None else CountCube.from_columns(columns, vocab)
+        self.cube_ids = self.cube.ids(self.author_list)
+        self.order, self.a_author, self.a_pub = explode(columns, vocab, self.author_list)
+
+    def publication(self, r):
+        # Built when rendered rather than kept, so that memory does not grow with the number of authors listed
+        columns, vocab = self.columns, self.vocab
+        i = self.order[r]
+        offsets = columns['authors_offsets']
+        return {'title': decode_string(columns['title'], columns['title_offsets'], i),
+                'url': decode_string(columns['url'], columns['url_offsets'], i),
+                'tags': {'year': int(columns['year'][i]), 'venue': vocab['venues'][columns['venue'][i]]},
+                'authors': [{'pid': vocab['authors'][a][0], 'text': vocab['authors'][a][1]}
+                            for a in columns['authors'][offsets[i]:offsets[i + 1]].tolist()]}
+
+    def tags(self, selected, predicate, dedup=False):
+        # Badges of the authors selected (positions in authors)
+        cube = self.cube
+        in_selected = np.zeros(len(cube.vocab['pids']), dtype=bool)
+        in_selected[self.cube_ids[selected]] = True
+        to_author = np.full(len(cube.vocab['pids']), -1, dtype=np.int64)
+        to_author[self.cube_ids[selected]] = selected
+
+        author, year, count, _ = cube.counts('pubs', 'year', predicate, in_selected, dedup)
+        idx = np.lexsort((-year, author))
+        tags = {'Year': group_lists(to_author[author[idx]], year[idx], count[idx], None)}
+        for bin, table, by, labels in [('Venue', 'pubs', 'venue', cube.vocab['venues']),
+                                       ('Interspeech', 'tracks', 'value', cube.vocab['tracks']),
+                                       ('IEEE', 'keywords', 'value', cube.vocab['keywords'])]:
+            author, value, count, first = cube.counts(table, by, predicate, in_selected, dedup)
+            tags[bin] = group_lists(*sort_counts(to_author[author], value, count, first), labels)
+        return tags
+
+    def select(self, predicate=None, author_start_year=None, rank_start=0, rank_end=None, dedup=False):
+        # Positions in authors of the authors ranked from rank_start to rank_end, in rank order. dedup: only count
+        # the first version of each paper
+        authors, author_list = self.authors, self.author_list
+        totals = self.cube.totals(predicate, dedup)
+        n_publs = np.where(self.cube_ids >= 0, totals[self.cube_ids], 0)
+        candidates = np.nonzero(n_publs)[0]
+        if author_start_year is not None:
+            candidates = np.array([c for c in candidates.tolist()
+                                   if authors[author_list[c]].first_year() >= author_start_year], dtype=np.int64)
+        candidates = candidates[np.argsort(-n_publs[candidates], kind='stable')]
+        return candidates[rank_start: rank_end]
+
+    def first_pubs(self, selected, predicate=None, n_pubs=20, dedup=False):
+        # The ranks of the first n_pubs publications of each author selected, by position in authors
+        in_pubs = np.isin(self.a_author, selected)
+        if predicate is not None:
+            venue, year = self.columns['venue'][self.order], self.columns['year'][self.order]
+            in_pubs &= select(predicate, self.vocab['venues'], venue, year)[self.a_pub]
+        if dedup and 'paper' in self.columns:
+            # First versions among the publications selected, as counted by the cube
+            in_selection = select(predicate, self.vocab['venues'], self.columns['venue'], self.columns['year'])
+            in_pubs &= first_versions(self.columns['paper'], in_selection)[self.order][self.a_pub]
+        a_author, a_pub = self.a_author[in_pubs], self.a_pub[in_pubs]
+        idx = np.argsort(a_author, kind='stable')
+        by_author, by_pub = a_author[idx], a_pub[idx]
+        starts = np.flatnonzero(np.r_[True, by_author[1:] != by_author[:-1]]) if len(idx) else idx
+        pos = np.arange(len(idx)) - np.repeat(starts, np.diff(np.r_[starts, len(idx)]))
+        return group_lists(by_author[pos < n_pubs], by_pub[pos < n_pubs], pos[pos < n_pubs], None)
+
+    def iter_rank(self, selected, predicate=None, n_pubs=20, rank_start=0, dedup=False):
+        # Yields new author dicts ready for rendering, one at a time; neither the columns nor authors are modified
+        authors, author_list = self.authors, self.author_list
+        tags = self.tags(selected, predicate, dedup)
+        pubs = self.first_pubs(selected, predicate, n_pubs, dedup)
+
+        for rank, c in enumerate(selected.tolist(), rank_start + 1):
+            author = authors[author_list[c]]
+            a = author.to_json()
+            if 'google' not in a:
+                a['google'] = "https://www.google.com/search?q=" + a['name'] + " site:scholar.google.com"
+            a['dblp'] = "https://dblp.uni-trier.de/pid/" + a['pid']
+            a['tags'] = dict((bin, tags[bin].get(c, [])) for bin in tags)
+            a['pubs'] = [self.publication(r) for r, _ in pubs.get(c, [])]
+            a['rank'] = rank
+            a['years'] = author.top_years()
+            yield a
+
+    def data(self, selected, predicate=None, n_pubs=20, rank_start=0, dedup=False):
+        # The authors selected as compact JSON for rendering in the browser: venues, tracks, keywords, publications
+        # and their authors are ids into lists, and each author has their counts by (venue, year), so that the
+        # ranking can be redone for any years and venues among those exported
+        cube = self.cube
+        vocab = dict((name, Vocab()) for name in ['venues', 'tracks', 'keywords', 'people'])
+        publications, publ_ids = [], {}
+        tags = self.tags(selected, predicate, dedup)
+        pubs = self.first_pubs(selected, predicate, n_pubs, dedup)
+
+        count, first = cube.count_columns('pubs', dedup, predicate)
+        m = cube.mask('pubs', predicate) & (count > 0)
+        rows = group_lists(cube.data['pubs_author'][m], np.flatnonzero(m), count[m], None)
+
+        results = []
+        for rank, c in enumerate(selected.tolist(), rank_start + 1):
+            a = self.authors[self.author_list[c]]
+            result = {'pid': a.pid, 'name': a.name, 'rank': rank, 'affiliation': list(a.affiliation),
+                      'url': list(a.url), 'years': a.top_years()}
+            if a.google is not None:
+                result['google'] = a.google
+            # [venue, year, count, rank of the first publication], the latter breaking ties of venues as above
+            result['counts'] = [[vocab['venues'][cube.vocab['venues'][cube.data['pubs_venue'][i]]],
+                                 int(cube.data['pubs_year'][i]), n, int(first[i])]
+                                for i, n in rows.get(int(self.cube_ids[c]), [])]
+            result['tracks'] = [[vocab['tracks'][k], n] for k, n in tags['Interspeech'].get(c, [])]
+            result['keywords'] = [[vocab['keywords'][k], n] for k, n in tags['IEEE'].get(c, [])]
+            result['pubs'] = []
+            for r, _ in pubs.get(c, []):
+                if r not in publ_ids:
+                    p = self.publication(r)
+                    publ_ids[r] = len(publications)
+                    publications.append([p['title'], p['url'], vocab['venues'][p['tags']['venue']], p['tags']['year'],
+                                         [vocab['people'][(x['pid'], x['text'])] for x in p['authors']]])
+                result['pubs'].append(publ_ids[r])
+            results.append(result)
+        return {'venues': vocab['venues'].items, 'tracks': vocab['tracks'].items,
+                'keywords': vocab['keywords'].items, 'people': [list(x) for x in vocab['people'].items],
+                'publications': publications, 'authors': results}
+
+    def rank(self, predicate=None, n_pubs=20, author_start_year=None, rank_start=0, rank_end=None, dedup=False):
+        selected = self.select(predicate, author_start_year, rank_start, rank_end, dedup)
+        return list(self.iter_rank(selected, predicate, n_pubs, rank_start, dedup))
+
+
+def rank_authors(columns, vocab, authors, n_pubs=20, author_start_year=None, rank_start=0, rank_end=None):
+    return AuthorTable(columns, vocab, authors).rank(None, n_pubs, author_start_year, rank_start, rank_end)
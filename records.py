@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from telemetry import telemetry
+
+# Intermediate data of prepare_data.py are stored as JSON Lines, one file per (venue, year) partition, i.e.
+# <stage dir>/<venue>/<year>.jsonl, so that stages can process them record by record. All writes go to a
+# temporary file first and are renamed into place once complete, so an interrupted run never leaves a truncated
+# file behind. Time spent (de)serializing records is accounted for in telemetry.
+
+
+def read_records(path):
+    n_bytes, seconds = 0, 0.
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                t = time.perf_counter()
+                record = json.loads(line)
+                seconds += time.perf_counter() - t
+                n_bytes += len(line)
+                yield record
+    finally:
+        telemetry.add_time('records.decode', seconds)
+        telemetry.count('records.bytes_read', n_bytes)
+
+
+def write_records(path, records):
+    # Returns the fingerprint of the content written
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    h = hashlib.sha1()
+    tmp_path = path + '.tmp'
+    n_bytes, seconds = 0, 0.
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                t = time.perf_counter()
+                line = json.dumps(record, ensure_ascii=False) + '\n'
+                h.update(line.encode('utf-8'))
+                f.write(line)
+                seconds += time.perf_counter() - t
+                n_bytes += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # e.g. records failed to be built; the file in place is left as it was
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    telemetry.add_time('records.encode', seconds)
+    telemetry.count('records.bytes_written', n_bytes)
+    return h.hexdigest()
+
+
+def file_fingerprint(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def list_years(venue_dir):
+    if not os.path.isdir(venue_dir):
+        return []
+    years = [f[:-len('.jsonl')] for f in os.listdir(venue_dir) if f.endswith('.jsonl')]
+    return sorted(years, key=int)
+
+
+list_delimiter = re.compile(r'\s*[,\]]')
+
+
+def read_json_list(path, chunk_size=1 << 20):
+    # Streams the items of a JSON list such as publications.json, reading chunk_size characters at a time, so that
+    # the whole list is never held in memory
+    decoder = json.JSONDecoder()
+    n_bytes, seconds = 0, 0.
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos, eof = '', 0, False
+
+        def fill():
+            # Drops what was decoded and reads the next chunk
+            nonlocal buf, pos, eof, n_bytes
+            more = f.read(chunk_size)
+            n_bytes += len(more)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+
+        def skip(chars):
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        skip(' \t\r\n')
+        if buf[pos:pos + 1] != '[':
+            raise ValueError("%s is not a JSON list" % path)
+        pos += 1
+        try:
+            while True:
+                skip(' \t\r\n,')
+                if eof and pos >= len(buf):
+                    raise ValueError("%s is truncated" % path)
+                if buf[pos] == ']':
+                    return
+                t = time.perf_counter()
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                finally:
+                    seconds += time.perf_counter() - t
+                # An item is only complete once followed by a delimiter, e.g. a number may go on in the next chunk
+                if end is None or (not eof and not list_delimiter.match(buf, end)):
+                    fill()
+                    continue
+                pos = end
+                yield item
+        finally:
+            telemetry.add_time('records.decode', seconds)
+            telemetry.count('records.bytes_read', n_bytes)
+
+
+def write_json_list(path, items):
+    # Streams items into a JSON list formatted as json.dump(list(items), indent=1) would; returns the fingerprint
+    h = hashlib.sha1()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        def write(text):
+            h.update(text.encode('utf-8'))
+            f.write(text)
+
+        write('[')
+        first = True
+        seconds = 0.
+        for item in items:
+            t = time.perf_counter()
+            write('\n' if first else ',\n')
+            write(' ' + json.dumps(item, ensure_ascii=False, indent=1).replace('\n', '\n '))
+            seconds += time.perf_counter() - t
+            first = False
+        write('\n]' if not first else ']')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    telemetry.add_time('records.encode', seconds)
+    telemetry.count('records.bytes_written', os.path.getsize(path))
+    return h.hexdigest()
@@ -0,0 +1,90 @@
+import json
+import re
+from collections import Counter
+
+# Rules of the filter stages of prepare_data.py, loaded from rules.json. A rule set matches a text if it contains
+# any of its "include" terms (substrings) or "include_words" (whole space-separated words), and none of its
+# "exclude" terms or "exclude_words", after normalization. Under "venues", {"all": true} matches every text of a
+# venue, and other keys add terms for that venue only. The terms of each (rule set, venue) are compiled into a
+# single regex, and the rule that decided each text is counted.
+
+rules_path = 'rules.json'
+
+normalizers = {
+    None: lambda text: text,
+    'lower': lambda text: text.lower(),
+    'dehyphen': lambda text: text.lower().replace('-', ''),
+    # Lowercase alphanumeric words separated by single spaces
+    'words': lambda text: re.sub(r'[\W_]+', ' ', text.lower()).strip(),
+}
+
+
+def compile_terms(terms, words):
+    # Longer terms first, so that the term reported is the longest one at the first position matched
+    alternatives = [re.escape(t) for t in sorted(set(terms), key=lambda t: (-len(t), t))]
+    if words:
+        alternatives.append(r'(?<![^ \n])(?:%s)(?![^ \n])' %
+                            '|'.join(re.escape(w) for w in sorted(set(words), key=lambda w: (-len(w), w))))
+    return re.compile('|'.join(alternatives)) if alternatives else None
+
+
+class RuleSet:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.normalize = normalizers[config.get('normalize')]
+        self.compiled = {}
+        self.counts = Counter()
+
+    def venue_config(self, venue=None):
+        # The rules that apply to a venue, e.g. to fingerprint the outputs built with them; venues with
+        # {"all": true} ignore the global terms, so only their override applies
+        override = self.config.get('venues', {}).get(venue, {})
+        if override.get('all'):
+            return {'venue': override}
+        config = dict((k, v) for k, v in self.config.items() if k != 'venues')
+        config['venue'] = override
+        return config
+
+    def patterns(self, venue):
+        if venue not in self.compiled:
+            override = self.config.get('venues', {}).get(venue, {})
+            if override.get('all'):
+                self.compiled[venue] = None
+            else:
+                def terms(key):
+                    return self.config.get(key, []) + override.get(key, [])
+                self.compiled[venue] = (compile_terms(terms('include'), terms('include_words')),
+                                        compile_terms(terms('exclude'), terms('exclude_words')))
+        return self.compiled[venue]
+
+    def match(self, text, venue=None):
+        # text: a string, or a list of strings that matches if any of them does
+        patterns = self.patterns(venue)
+        if patterns is None:
+            self.counts['venue:%s' % venue] += 1
+            return True
+        if not isinstance(text, str):
+            text = '\n'.join(self.normalize(t) for t in text)
+        else:
+            text = self.normalize(text)
+        include, exclude = patterns
+        m = include.search(text) if include is not None else None
+        if m is None:
+            self.counts['none'] += 1
+            return False
+        e = exclude.search(text) if exclude is not None else None
+        if e is not None:
+            self.counts['exclude:%s' % e.group(0)] += 1
+            return False
+        self.counts['include:%s' % m.group(0)] += 1
+        return True
+
+    def report(self):
+        if self.counts:
+            print("Rules %s: %s" % (self.name, ', '.join('%s=%d' % (k, c) for k, c in self.counts.most_common())))
+
+
+def load_rules(path=rules_path):
+    config = json.load(open(path, 'r', encoding='utf-8'))
+    return dict((name, RuleSet(name, c)) for name, c in config.items())
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+import publ_store
+import author_store
+from cube import CountCube, cube_file, cube_vocab_file
+
+# Snapshot of what export.py loads, written by prepare_data.py after its last stage: the columns of all partitions
+# of the columnar store, the authors vocab, the count cube and authors.json, each array saved as one .npy file
+# under <path>, and loaded memory-mapped, i.e. without parsing nor copying but for what is used. meta.json keeps
+# the rest (partitions with their rows, small vocabs, fields of authors other than those of Author), and the size
+# and time of the files the snapshot was made from, so that it is only used while they are unchanged.
+
+version = 1
+snapshot_path = os.path.join('cache', 'snapshot')
+
+
+def sources(store_path=publ_store.store_path, authors_path='authors.json'):
+    return [os.path.join(store_path, name) for name in ['index.json', 'vocab.json', 'authors.npz', cube_file,
+                                                        cube_vocab_file]] + [authors_path]
+
+
+def stats(paths):
+    stats = {}
+    for p in paths:
+        if os.path.exists(p):
+            s = os.stat(p)
+            stats[p] = [s.st_size, s.st_mtime_ns]
+    return stats
+
+
+def read_meta(path=snapshot_path):
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    return json.load(open(meta_path, 'r', encoding='utf-8'))
+
+
+def fresh(path=snapshot_path):
+    # Whether the snapshot is there and was made from the files now in place
+    meta = read_meta(path)
+    return meta is not None and meta['version'] == version and meta['sources'] == stats(sources())
+
+
+def write(path=snapshot_path, store_path=publ_store.store_path, authors_path='authors.json'):
+    # Requires the columnar store, its cube and authors.json
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    # Stats are taken first, so that files changed while writing make the snapshot stale
+    meta = {'version': version, 'sources': stats(sources(store_path, authors_path))}
+
+    def save(group, arrays):
+        for name, a in arrays.items():
+            np.save(os.path.join(tmp_path, '%s.%s.npy' % (group, name)), np.asarray(a))
+
+    index = [p for p in publ_store.read_index(store_path) if p['n'] > 0]
+    columns, vocab = publ_store.load_columns(None, store_path)
+    start = 0
+    meta['parts'] = []
+    for p in index:
+        meta['parts'].append([p['venue'], p['year'], start, start + p['n']])
+        start += p['n']
+    save('columns', columns)
+    save('vocab', vocab['authors'].arrays())
+    meta['vocab'] = dict((k, v) for k, v in vocab.items() if k != 'authors')
+    del columns, vocab
+
+    cube = CountCube.load(store_path)
+    save('cube', dict(cube.data, **cube.vocab['pids'].arrays('pids'), **cube.vocab['names'].arrays('names')))
+    meta['cube_vocab'] = dict((k, v) for k, v in cube.vocab.items() if k not in ['pids', 'names'])
+    del cube
+
+    authors = author_store.load_authors(authors_path)
+    save('authors', author_store.author_arrays(authors))
+    meta['author_extra'] = dict((pid, a.extra) for pid, a in authors.items() if a.extra)
+    del authors
+
+    json.dump(meta, open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8'), ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def read_arrays(group, path=snapshot_path):
+    prefix = group + '.'
+    return dict((f[len(prefix):-len('.npy')], np.load(os.path.join(path, f), mmap_mode='r', allow_pickle=False))
+                for f in sorted(os.listdir(path)) if f.startswith(prefix) and f.endswith('.npy'))
+
+
+def rows(columns, start, end):
+    # Columns of rows start to end, as views but for the offsets
+    part = {}
+    for field, column in columns.items():
+        if field.endswith('_offsets'):
+            continue
+        if field + '_offsets' in columns:
+            offsets = columns[field + '_offsets']
+            part[field] = column[offsets[start]:offsets[end]]
+            part[field + '_offsets'] = offsets[start:end + 1] - offsets[start]
+        else:
+            part[field] = column[start:end]
+    return part
+
+
+def load_columns(predicate=None, path=snapshot_path):
+    # As publ_store.load_columns; runs of selected partitions are read as one
+    meta = read_meta(path)
+    columns = read_arrays('columns', path)
+    ranges = []
+    for venue, year, start, end in meta['parts']:
+        if predicate is None or predicate(venue, year):
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+    vocab = dict(meta['vocab'], authors=publ_store.AuthorVocab.from_arrays(read_arrays('vocab', path)))
+    if not ranges:
+        return publ_store.columns_from_publications([])[0], vocab
+    parts = [rows(columns, start, end) for start, end in ranges]
+    return parts[0] if len(parts) == 1 else publ_store.concat_columns(parts), vocab
+
+
+def load_parts(path=snapshot_path):
+    # (venue, year) of the partitions
+    return [(venue, year) for venue, year, _, _ in read_meta(path)['parts']]
+
+
+def load_cube(path=snapshot_path):
+    data = read_arrays('cube', path)
+    vocab = dict(read_meta(path)['cube_vocab'])
+    for name in ['pids', 'names']:
+        vocab[name] = publ_store.Strings.from_arrays(data.pop(name), data.pop(name + '_offsets'))
+    return CountCube(data, vocab)
+
+
+def load_authors(path=snapshot_path):
+    return author_store.authors_from_arrays(read_arrays('authors', path), read_meta(path)['author_extra'])
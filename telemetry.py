@@ -0,0 +1,182 @@
+import bisect
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Timers and counters of a run of prepare_data.py or export.py: time spent in each stage or phase, page cache hits
+# and misses, requests, bytes, latencies, retries and backoff per host, and time spent parsing pages and
+# (de)serializing records. Timers may overlap, e.g. a stage and the requests made during it. At the end of a run a
+# JSON report is written and a summary printed; a profile of the run, by cProfile or by sampling the stacks of all
+# threads, can be added to it.
+
+latency_buckets = [0.01, 0.03, 0.1, 0.3, 1., 3., 10., 30.]
+report_dir = os.path.join('cache', 'reports')
+
+
+class Telemetry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.counters = Counter()
+        self.timers = {}
+        self.histograms = {}
+        self.profile = None
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        # Timers keep their number of calls, total and max time
+        with self.lock:
+            t = self.timers.setdefault(name, [0, 0., 0.])
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t)
+
+    def observe(self, name, seconds):
+        # Histogram over latency_buckets, the last bin counting what is above all of them
+        i = bisect.bisect_left(latency_buckets, seconds)
+        with self.lock:
+            self.histograms.setdefault(name, [0] * (len(latency_buckets) + 1))[i] += 1
+
+    def report(self, **extra):
+        report = dict(extra)
+        report.update({'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                       'wall': time.time() - self.started,
+                       'timers': dict((k, {'count': c, 'total': t, 'max': m})
+                                      for k, (c, t, m) in sorted(self.timers.items())),
+                       'counters': dict(sorted(self.counters.items())),
+                       'histograms': {'buckets': latency_buckets, 'counts': dict(sorted(self.histograms.items()))}})
+        if self.profile is not None:
+            report['profile'] = self.profile
+        return report
+
+    def summary(self):
+        lines = ["Run of %.1fs" % (time.time() - self.started)]
+        if self.timers:
+            lines.append("%-48s %8s %10s %10s" % ('Timers', 'count', 'total', 'max'))
+            for k, (c, t, m) in sorted(self.timers.items()):
+                lines.append("  %-46s %8d %9.2fs %9.2fs" % (k, c, t, m))
+        if self.counters:
+            lines.append("Counters")
+            for k, c in sorted(self.counters.items()):
+                lines.append("  %-46s %8d" % (k, c))
+        if self.histograms:
+            lines.append("Latencies")
+        for k, counts in sorted(self.histograms.items()):
+            bins = ['<=%gs: %d' % (b, c) for b, c in zip(latency_buckets, counts) if c] + \
+                   (['>%gs: %d' % (latency_buckets[-1], counts[-1])] if counts[-1] else [])
+            lines.append("  %s: %s" % (k, ', '.join(bins)))
+        if self.profile is not None:
+            lines.append("Profile (%s), top functions:" % self.profile['kind'])
+            for f in self.profile['top'][:10]:
+                lines.append("  %6.1f%%  %s" % (100 * f['share'], f['function']))
+        return '\n'.join(lines)
+
+    def finish(self, path, **extra):
+        # Writes the JSON report to path and prints the summary
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        json.dump(self.report(**extra), open(path, 'w', encoding='utf-8'), ensure_ascii=False, indent=1)
+        print(self.summary())
+        print("Run report written to", path)
+
+
+def report_path(script):
+    # With the process id, so that runs started within the same second do not overwrite each other's report
+    return os.path.join(report_dir, '%s-%s-%d.json' % (script, datetime.datetime.now().strftime('%Y%m%d-%H%M%S'),
+                                                       os.getpid()))
+
+
+def function_name(code):
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class Sampler:
+    # Samples the stacks of all other threads every interval seconds; a function's share is the fraction of samples
+    # in which it is on a stack, i.e. its inclusive time summed over threads
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.counts = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread, frame in sys._current_frames().items():
+                if thread == me:
+                    continue
+                self.samples += 1
+                seen = set()
+                while frame is not None:
+                    seen.add(function_name(frame.f_code))
+                    frame = frame.f_back
+                self.counts.update(seen)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def top(self, n=30):
+        return [{'function': f, 'share': c / max(self.samples, 1)} for f, c in self.counts.most_common(n)]
+
+
+@contextmanager
+def profile(kind, path=None):
+    # kind: None, 'cprofile' (main thread only; the stats are also saved to path for pstats or snakeviz) or 'sample'
+    if kind is None:
+        yield
+        return
+    if kind == 'cprofile':
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stats = pstats.Stats(profiler)
+            total = max(stats.total_tt, 1e-9)
+            top = sorted(stats.stats.items(), key=lambda x: -x[1][3])[:30]
+            telemetry.profile = {'kind': kind, 'top': [{'function': '%s (%s:%d)' % (f[2], os.path.basename(f[0]), f[1]),
+                                                        'share': v[3] / total, 'cumulative': v[3], 'own': v[2]}
+                                                       for f, v in top]}
+            if path is not None:
+                profiler.dump_stats(path)
+                telemetry.profile['stats'] = path
+    elif kind == 'sample':
+        sampler = Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            telemetry.profile = {'kind': kind, 'interval': sampler.interval, 'samples': sampler.samples,
+                                 'top': sampler.top()}
+    else:
+        raise ValueError("Unknown profiler %s" % kind)
+
+
+telemetry = Telemetry()
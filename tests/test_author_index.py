@@ -0,0 +1,29 @@
+import json
+
+from author_index import AuthorIndex, build_index
+
+
+def author(pid, name, affiliation, years):
+    return {'pid': pid, 'name': name, 'affiliation': affiliation, 'url': [], 'years': years, 'years_dedup': years}
+
+
+def test_query(tmp_path):
+    authors = dict((a['pid'], a) for a in [
+        author('a/1', 'Jürgen Müller 0001', ['Saarland University'], {'2019': 2, '2023': 1}),
+        author('b/2', 'Anna Müller', ['University of Stuttgart'], {'2021': 3}),
+        author('c/3', 'Bob Smith', ['Saarland University'], {'2015': 1})])
+    authors_path, path = str(tmp_path / 'authors.json'), str(tmp_path / 'author_index')
+    json.dump(authors, open(authors_path, 'w', encoding='utf-8'))
+    build_index(authors_path, path)
+    index = AuthorIndex(path)
+
+    assert index.get('b/2').name == 'Anna Müller'
+    assert index.get('x/9') is None
+    assert index.query(name='muller').tolist() == [0, 1]
+    assert index.query(name='Müller 0001').tolist() == [0]
+    assert index.query(name='muller', affiliation='saarland').tolist() == [0]
+    assert index.query(first_start=2016).tolist() == [0, 1]
+    assert index.query(name='nobody').tolist() == []
+    # A text without tokens matches no one, rather than every author
+    assert index.query(name='!!!').tolist() == []
+    assert index.query().tolist() == [0, 1, 2]
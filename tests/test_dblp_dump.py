@@ -0,0 +1,44 @@
+import gzip
+import os
+import shutil
+
+import pytest
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+dump_path = os.path.join(data_dir, 'dblp_sample.xml')
+
+
+@pytest.fixture
+def fetch(tmp_path, monkeypatch):
+    # fetch.py creates its cache directory when imported, hence in a temporary directory
+    monkeypatch.chdir(tmp_path)
+    import fetch
+    return fetch
+
+
+def person_page(pid):
+    with open(os.path.join(data_dir, 'dblp_person_%s.xml' % pid.replace('/', '-')), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('gz', [False, True])
+def test_same_as_person_pages(fetch, tmp_path, monkeypatch, gz):
+    from dblp_dump import read_author_info
+    path = dump_path
+    if gz:
+        path = str(tmp_path / 'dblp.xml.gz')
+        with open(dump_path, 'rb') as f, gzip.open(path, 'wb') as g:
+            shutil.copyfileobj(f, g)
+    monkeypatch.setattr(fetch, 'get_page', lambda url, params, cache_dir, refresh=False: person_page('12/3456'))
+
+    results = read_author_info(path, ['12/3456', '78/9', '99/999'])
+    assert sorted(results) == ['12/3456', '78/9']
+    expected = fetch.get_author_info('12/3456')
+    assert results['12/3456'] == expected
+    # Entities decoded, the name with an alias, editorship counted, and the CoRR version deduplicated
+    assert expected['name'] == 'Jürgen Müller 0001'
+    assert expected['affiliation'] == ['Universität Stuttgart, Germany', 'Saarland University, Germany (former)']
+    assert expected['url'] == ['https://example.org/~jm']
+    assert dict(expected['years']) == {2023: 2, 2022: 1, 2020: 1}
+    assert dict(expected['years_dedup']) == {2023: 1, 2022: 1, 2020: 1}
+    assert dict(results['78/9']['years']) == {2023: 1}
@@ -0,0 +1,57 @@
+import publ_store
+from cube import CountCube, build_cube, make_predicate
+from paper_index import PaperIndex
+from ranking import AuthorTable
+
+
+def publication(title, pid, name, venue, year):
+    return {'title': title, 'key': '%s/%d/%s' % (venue, year, title), 'url': 'https://example.org/' + title,
+            'authors': [{'@pid': pid, 'text': name}], 'tags': {'venue': venue, 'year': year}}
+
+
+# In the order of publications.json, i.e. by venue: the same paper in TASLP 2020 comes before its ICASSP 2019
+# version
+publications = [publication('A shared paper', 'b/2', 'Bob', 'TASLP', 2020),
+                publication('A first paper', 'a/1', 'Alice', 'ICASSP', 2019),
+                publication('A second paper', 'a/1', 'Alice', 'ICASSP', 2019),
+                publication('A shared paper', 'b/2', 'Bob', 'ICASSP', 2019)]
+authors = dict((pid, {'pid': pid, 'name': name, 'affiliation': [], 'url': [], 'years': {}, 'years_dedup': {}})
+               for pid, name in [('a/1', 'Alice'), ('b/2', 'Bob')])
+
+
+def with_paper_ids(publs):
+    index = PaperIndex(authors=True)
+    for p in publs:
+        p['paper'] = index.paper_id(p['title'], [a['@pid'] for a in p['authors']], p['url'])
+    return publs
+
+
+def ranked(table, predicate):
+    return [(a['name'], [(p['tags']['venue'], p['tags']['year']) for p in a['pubs']])
+            for a in table.rank(predicate, dedup=True)]
+
+
+def test_first_version_within_selection(tmp_path):
+    publs = with_paper_ids([dict(p) for p in publications])
+    path = str(tmp_path / 'publications')
+    publ_store.write_publications(publs, path)
+    build_cube(path)
+    predicate = make_predicate(year_end=2019)
+
+    # Without the store, only the publications selected are loaded, hence deduplicated among themselves
+    selected = [p for p in publs if predicate(p['tags']['venue'], p['tags']['year'])]
+    columns, vocab = publ_store.columns_from_publications(selected)
+    expected = [('Alice', [('ICASSP', 2019), ('ICASSP', 2019)]), ('Bob', [('ICASSP', 2019)])]
+    assert ranked(AuthorTable(columns, vocab, authors), predicate) == expected
+
+    # With the store, the selected partitions and the cube of all publications
+    columns, vocab = publ_store.load_columns(predicate, path)
+    cube = CountCube.load(path)
+    assert ranked(AuthorTable(columns, vocab, authors, cube), predicate) == expected
+    assert cube.top(predicate=predicate, dedup=True) == [('a/1', 'Alice', 2), ('b/2', 'Bob', 1)]
+    assert cube.author('b/2', predicate, dedup=True)['venue'] == [('ICASSP', 1)]
+
+    # Over all years, the paper counts once, at its TASLP version
+    assert cube.top(dedup=True) == [('a/1', 'Alice', 2), ('b/2', 'Bob', 1)]
+    assert sorted(cube.top()) == [('a/1', 'Alice', 2), ('b/2', 'Bob', 2)]
+    assert cube.author('b/2', dedup=True)['venue'] == [('TASLP', 1)]
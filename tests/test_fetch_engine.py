@@ -0,0 +1,87 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+from fetch_engine import FetchEngine
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    # /ok answers 200; /limited answers 429 with Retry-After: 1 once, then 200; /down always answers 500
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, time.monotonic()))
+            n = sum(1 for p, _ in server.requests if p == self.path)
+        if self.path == '/limited' and n == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            body = b'slow down'
+        elif self.path == '/down':
+            self.send_response(500)
+            body = b'error'
+        else:
+            self.send_response(200)
+            body = ('page %s' % self.path).encode('utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_engine(server, rate=100., burst=1, **kwargs):
+    host = '127.0.0.1:%d' % server.server_address[1]
+    engine = FetchEngine(limits={host: {'rate': rate, 'burst': burst, 'concurrency': 4}}, backoff_base=0.01,
+                         timeout=5., **kwargs)
+    return engine, 'http://%s' % host
+
+
+def test_per_host_rate(server):
+    engine, base = make_engine(server, rate=20.)
+    try:
+        pages = engine.get_many([(base + '/ok', {'i': i}) for i in range(6)])
+    finally:
+        engine.close()
+    assert pages == ['page /ok?i=%d' % i for i in range(6)]
+    times = sorted(t for _, t in server.requests)
+    assert len(times) == 6
+    # One token every 1/20 s after the first, whatever the concurrency
+    assert times[-1] - times[0] >= 5 / 20 - 0.02
+    assert min(b - a for a, b in zip(times, times[1:])) >= 1 / 20 - 0.02
+
+
+def test_retry_after(server):
+    engine, base = make_engine(server)
+    try:
+        t = time.monotonic()
+        page = engine.get(base + '/limited')
+        elapsed = time.monotonic() - t
+    finally:
+        engine.close()
+    assert page == 'page /limited'
+    assert [p for p, _ in server.requests] == ['/limited', '/limited']
+    assert elapsed >= 1.
+
+
+def test_retry_exhaustion(server):
+    engine, base = make_engine(server, max_retries=2)
+    try:
+        with pytest.raises(ValueError):
+            engine.get(base + '/down')
+    finally:
+        engine.close()
+    assert [p for p, _ in server.requests] == ['/down'] * 3
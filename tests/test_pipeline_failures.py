@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+stages = ['collect_interspeech_track', 'filter_non_speech_venue', 'aggregate']
+
+
+@pytest.fixture
+def prepare_data(tmp_path, monkeypatch):
+    # prepare_data.py reads rules.json and fetch.py creates its cache directory, both in the current directory
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(os.path.join(root, 'rules.json'), 'rules.json')
+    import prepare_data
+    return prepare_data
+
+
+def paper(year, i):
+    return {'info': {'title': 'Paper %d of %d.' % (i, year), 'key': 'conf/interspeech/%d-%d' % (year, i),
+                     'ee': 'https://doi.org/%d/%d' % (year, i), 'type': 'Conference and Workshop Papers',
+                     'authors': {'author': [{'@pid': 'a/1', 'text': 'Alice'}]}}}
+
+
+def test_failed_partition_held_back(prepare_data, monkeypatch):
+    from pipeline import Manifest, Run
+    from records import write_records
+    from work_queue import WorkQueue
+    pd = prepare_data
+    for year in [2024, 2025]:
+        write_records(pd.partition_path('publ_all', 'Interspeech', year), [paper(year, i) for i in range(3)])
+    offline = set()
+
+    def tracks(url):
+        if any(year in url for year in offline):
+            raise ValueError("Offline")
+        return {'Speech': []}
+    monkeypatch.setattr(pd, 'get_interspeech_tracks', tracks)
+    manifest, queue = Manifest('manifest.json'), WorkQueue(os.path.join('cache', 'work_queue.sqlite'))
+
+    def run():
+        r = Run(manifest, ['Interspeech'], queue=queue)
+        for stage in stages:
+            pd.stages[stage](r)
+
+    def years():
+        return sorted(set(p['tags']['year'] for p in json.load(open('publications.json', 'r', encoding='utf-8'))))
+
+    # A year failing upstream holds back publications.json, rather than leaving the year out
+    offline.add('2025')
+    run()
+    assert not os.path.exists('publications.json')
+    assert [(kind, part) for kind, part, _, _, _ in queue.failures()] == \
+           [('aggregate', 'Interspeech/2025'), ('collect_interspeech_track', 'Interspeech/2025'),
+            ('filter_non_speech_venue', 'Interspeech/2025')]
+    monkeypatch.setattr(pd, 'allow_incomplete', True)
+    run()
+    assert years() == [2024]
+
+    offline.clear()
+    monkeypatch.setattr(pd, 'allow_incomplete', False)
+    run()
+    assert years() == [2024, 2025]
+    assert queue.failures() == []
+
+    # Partitions downstream of a failed one are kept, not dropped
+    os.remove(pd.partition_path('publ_ex', 'Interspeech', 2025))
+    offline.add('2025')
+    run()
+    assert os.path.exists(pd.partition_path('publ_agg', 'Interspeech', 2025))
+    assert years() == [2024, 2025]
@@ -0,0 +1,12 @@
+from rules import RuleSet
+
+
+def test_venue_config():
+    config = {'include': ['speech'], 'exclude': ['hate'],
+              'venues': {'TASLP': {'all': True}, 'NLP': {'include': ['asr']}}}
+    edited = dict(config, include=['speech', 'voice'])
+    # Venues matching everything do not depend on the global terms, other venues do
+    assert RuleSet('r', config).venue_config('TASLP') == RuleSet('r', edited).venue_config('TASLP')
+    assert RuleSet('r', config).venue_config('NLP') != RuleSet('r', edited).venue_config('NLP')
+    assert RuleSet('r', config).venue_config('Other') != RuleSet('r', edited).venue_config('Other')
+    assert RuleSet('r', config).match('anything', 'TASLP')
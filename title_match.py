@@ -0,0 +1,98 @@
+import html
+import math
+from collections import defaultdict
+
+# Matching of DBLP titles against titles listed elsewhere (e.g. the ISCA archive), which differ in quotes, dashes,
+# punctuation, accents and the odd typo. Titles are reduced to their lowercase ASCII letters; exact keys are looked
+# up first, and other titles are matched through an inverted index of letter trigrams, accepting the candidate with
+# the highest Jaccard similarity if it reaches the threshold. Only titles sharing one of the rarest trigrams of a
+# title are compared with it.
+
+
+def normalize_title(title):
+    import unidecode
+    title = unidecode.unidecode(html.unescape(title).lower())
+    return ''.join([c for c in title if c.islower()])
+
+
+def trigrams(key):
+    return set(key[i:i + 3] for i in range(len(key) - 2)) if len(key) >= 3 else {key}
+
+
+class TitleIndex:
+    def __init__(self, threshold=0.75):
+        self.threshold = threshold
+        self.titles = []
+        self.values = []
+        self.grams = []
+        self.ids = {}
+        self.postings = defaultdict(list)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def add(self, title, value):
+        # Returns the title previously added with the same key, if any; its value is replaced
+        key = normalize_title(title)
+        if key in self.ids:
+            i = self.ids[key]
+            previous = self.titles[i]
+            self.values[i] = value
+            return previous
+        i = len(self.titles)
+        self.ids[key] = i
+        self.titles.append(title)
+        self.values.append(value)
+        self.grams.append(trigrams(key))
+        for g in self.grams[i]:
+            self.postings[g].append(i)
+        return None
+
+    def lookup(self, title):
+        # Returns (value, matched title, similarity, exact); (None, None, best similarity, False) if there is no match
+        key = normalize_title(title)
+        if key in self.ids:
+            i = self.ids[key]
+            return self.values[i], self.titles[i], 1.0, True
+        # A title with similarity >= threshold shares at least threshold * len(grams) trigrams with the query, so
+        # it has one of its len(grams) - ceil(threshold * len(grams)) + 1 rarest trigrams
+        grams = trigrams(key)
+        rarest = sorted(grams, key=lambda g: len(self.postings.get(g, ())))
+        candidates = set()
+        for g in rarest[:len(grams) - math.ceil(self.threshold * len(grams)) + 1]:
+            candidates.update(self.postings.get(g, ()))
+        # Its own number of trigrams is also within [threshold * len(grams), len(grams) / threshold]
+        low, high = self.threshold * len(grams), len(grams) / self.threshold
+        best, best_score = None, 0.0
+        for i in sorted(candidates):
+            if not low <= len(self.grams[i]) <= high:
+                continue
+            n = len(grams & self.grams[i])
+            score = n / (len(grams) + len(self.grams[i]) - n)
+            if score > best_score:
+                best, best_score = i, score
+        if best is None or best_score < self.threshold:
+            return None, None, best_score, False
+        return self.values[best], self.titles[best], best_score, False
+
+
+class MatchReport:
+    def __init__(self):
+        self.exact = 0
+        self.fuzzy = []
+        self.unmatched = []
+
+    def add(self, title, matched, score, exact):
+        if matched is None:
+            self.unmatched.append(title)
+        elif exact:
+            self.exact += 1
+        else:
+            self.fuzzy.append((title, matched, round(score, 3)))
+
+    def summary(self):
+        n = self.exact + len(self.fuzzy) + len(self.unmatched)
+        return "%d/%d exact, %d fuzzy, %d unmatched" % (self.exact, n, len(self.fuzzy), len(self.unmatched))
+
+    def to_dict(self):
+        return {'exact': self.exact, 'fuzzy': self.fuzzy, 'unmatched': self.unmatched}
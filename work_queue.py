@@ -0,0 +1,102 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+# State of the work items of prepare_data.py that may fail on their own: DBLP issues, IEEE documents, partitions
+# (e.g. of ISCA pages) and authors, kept in SQLite so that it survives crashes. Each item belongs to a partition of
+# the pipeline and is pending, done, or failed with its error. Results are checkpointed by the stages themselves as
+# they go (parsed pages in the page cache, authors in the author store), so a restart only does the work of the
+# items left pending or failed, and --retry-failed only that of the failed ones. Updates are committed in batches.
+
+states = ['pending', 'done', 'failed']
+
+
+class WorkQueue:
+    def __init__(self, path, commit_every=100):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.commit_every = commit_every
+        self.n_updates = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS items (kind TEXT, part TEXT, item TEXT, state TEXT, '
+                          'error TEXT, attempts INTEGER, updated REAL, PRIMARY KEY (kind, part, item))')
+        self.conn.commit()
+
+    def update(self, kind, part, item, state, error=None):
+        # Attempts count the items started, i.e. set pending, and those failed without having been set pending
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (kind, part, item) DO UPDATE SET '
+                'state = excluded.state, error = excluded.error, updated = excluded.updated, '
+                'attempts = attempts + (excluded.state = \'pending\' OR (excluded.state = \'failed\' AND state != \'pending\'))',
+                (kind, part, item, state, error, int(state != 'done'), time.time()))
+            self.n_updates += 1
+            if self.n_updates % self.commit_every == 0:
+                self.conn.commit()
+
+    def add(self, kind, part, item):
+        self.update(kind, part, item, 'pending')
+
+    def done(self, kind, part, item):
+        self.update(kind, part, item, 'done')
+
+    def failed(self, kind, part, item, error):
+        self.update(kind, part, item, 'failed', str(error))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def items(self, kind, part=None, states=('pending', 'failed')):
+        # (part, item) of a kind in any of states
+        query = 'SELECT part, item FROM items WHERE kind = ? AND state IN (%s)' % ','.join('?' * len(states))
+        params = [kind] + list(states)
+        if part is not None:
+            query += ' AND part = ?'
+            params.append(part)
+        with self.lock:
+            return self.conn.execute(query + ' ORDER BY part, item', params).fetchall()
+
+    def unfinished(self, kind, part=None, retry_failed=False):
+        # Whether items are left to do: failed ones only with retry_failed, otherwise pending or failed ones
+        return bool(self.items(kind, part, ['failed'] if retry_failed else ['pending', 'failed']))
+
+    def counts(self):
+        # {kind: {state: count}}
+        counts = {}
+        with self.lock:
+            for kind, state, n in self.conn.execute('SELECT kind, state, COUNT(*) FROM items GROUP BY kind, state'):
+                counts.setdefault(kind, {})[state] = n
+        return counts
+
+    def failures(self, kind=None):
+        query = 'SELECT kind, part, item, error, attempts FROM items WHERE state = \'failed\''
+        with self.lock:
+            if kind is None:
+                return self.conn.execute(query + ' ORDER BY kind, part, item').fetchall()
+            return self.conn.execute(query + ' AND kind = ? ORDER BY part, item', (kind,)).fetchall()
+
+    def report(self):
+        counts = self.counts()
+        n_left = sum(c.get('failed', 0) + c.get('pending', 0) for c in counts.values())
+        if n_left:
+            print("Work left: %s; rerun, or use --retry-failed for failed items only (details: python work_queue.py)" %
+                  ', '.join('%s %d failed, %d pending' % (k, c.get('failed', 0), c.get('pending', 0))
+                            for k, c in sorted(counts.items()) if c.get('failed') or c.get('pending')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', type=str, default=os.path.join('cache', 'work_queue.sqlite'))
+    parser.add_argument('--kind', type=str, default=None, help="Only list the failures of this kind of items")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.path)
+    for kind, c in sorted(queue.counts().items()):
+        print("%-28s %s" % (kind, ', '.join('%s %d' % (s, c[s]) for s in states if s in c)))
+    for kind, part, item, error, attempts in queue.failures(args.kind):
+        print("%s %s %s (%d attempts): %s" % (kind, part, item, attempts, error))